@@ -0,0 +1,404 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+from bisect import bisect
+import json
+from multiprocessing import Process
+from multiprocessing import Queue
+import platform
+from Queue import Empty
+import random
+import sys
+import timeit
+import traceback
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+from samecode import halohash
+from samecode import hash as commoncode_hash
+from samecode.index import MultiIndexHash
+
+
+"""
+Benchmarks of the HaloHash variants on deterministic synthetic corpora.
+
+For each corpus size, HaloHash variant and size in bits, report the hashing
+throughput in tokens per second, the peak memory used while hashing and the
+latency of distance computations and index queries. Results are written as
+JSON and can be compared between two runs to catch performance regressions.
+
+Run with:
+    python -m samecode.benchmark --output results.json [--baseline old.json]
+"""
+
+# HaloHash variant name -> (class, streaming)
+VARIANTS = {
+    'BitAverageHaloHash': (halohash.BitAverageHaloHash, False),
+    'BitAverageHaloHash-streaming': (halohash.BitAverageHaloHash, True),
+    'BitQuartileHaloHash': (halohash.BitQuartileHaloHash, False),
+    'BitQuartileHaloHash-streaming': (halohash.BitQuartileHaloHash, True),
+    'BucketAverageHaloHash': (halohash.BucketAverageHaloHash, None),
+}
+
+SIZES_IN_BITS = (32, 64, 128, 256)
+
+CORPUS_SIZES = (10000, 100000, 1000000)
+
+# number of documents hashed for distance and query latencies
+DOCUMENTS = 200
+
+# maximum time in seconds for a case run in a separate process
+CASE_TIMEOUT = 3600
+
+# throughput and latency metrics and whether higher values are better
+METRICS = {
+    'tokens_per_second': True,
+    'peak_memory_kb': False,
+    'distance_us': False,
+    'query_us': False,
+}
+
+
+def corpus(tokens_count, seed=42, vocabulary=5000):
+    """
+    Return a list of `tokens_count` synthetic tokens drawn with a Zipf-like
+    distribution from a `vocabulary` of words. The same `seed` always yields
+    the same corpus.
+
+    For example:
+    >>> corpus(5) == corpus(5)
+    True
+    >>> len(corpus(5))
+    5
+    """
+    rand = random.Random(seed)
+    words = ['tok%d_%x' % (i, rand.getrandbits(24)) for i in range(vocabulary)]
+    # rank-based weights approximating the distribution of source code tokens
+    weights = [1.0 / (rank + 1) for rank in range(vocabulary)]
+    cumulative = []
+    total = 0
+    for w in weights:
+        total += w
+        cumulative.append(total)
+    return [words[bisect(cumulative, rand.random() * total)]
+            for _ in xrange(tokens_count)]
+
+
+def supported(variant, size_in_bits):
+    """
+    Return True if a `variant` HaloHash can be built with `size_in_bits`.
+    Bit matrix hashes need a hash function of `size_in_bits` (or half of it
+    for quartiles). Bucket hashes need a power of two size of fewer bits than
+    their 160 bits hash function.
+
+    For example:
+    >>> supported('BitAverageHaloHash', 128), supported('BitAverageHaloHash', 1024)
+    (True, False)
+    >>> supported('BitQuartileHaloHash', 1024)
+    True
+    >>> supported('BucketAverageHaloHash', 64), supported('BucketAverageHaloHash', 96)
+    (True, False)
+    """
+    cls, _streaming = VARIANTS[variant]
+    if issubclass(cls, halohash.BaseBucketHaloHash):
+        is_power_of_two = size_in_bits > 0 and not size_in_bits & (size_in_bits - 1)
+        return has_hasher(160) and is_power_of_two and size_in_bits < 2 ** 160
+    if issubclass(cls, halohash.BitQuartileHaloHash):
+        return not size_in_bits % 2 and has_hasher(size_in_bits // 2)
+    return has_hasher(size_in_bits)
+
+
+def has_hasher(bitsize):
+    """
+    Return True if there is a hasher for hashes of `bitsize` bits.
+    """
+    try:
+        commoncode_hash.get_hasher(bitsize)
+        return True
+    except KeyError:
+        return False
+
+
+def new_hash(variant, size_in_bits):
+    """
+    Return a new empty `variant` HaloHash of `size_in_bits`. Raise a
+    ValueError if this variant does not support this size.
+    """
+    if not supported(variant, size_in_bits):
+        raise ValueError('Unsupported size in bits for %(variant)s: '
+                         '%(size_in_bits)d' % locals())
+    cls, streaming = VARIANTS[variant]
+    if streaming is None:
+        return cls(size_in_bits=size_in_bits)
+    return cls(size_in_bits=size_in_bits, streaming=streaming)
+
+
+def peak_memory_kb():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(variant, size_in_bits, tokens):
+    """
+    Return a mapping of benchmark metrics for a `variant` HaloHash of
+    `size_in_bits` and a list of `tokens`. Raise a ValueError if this variant
+    does not support this size.
+    """
+    new_hash(variant, size_in_bits)
+
+    memory_before = peak_memory_kb()
+    start = timeit.default_timer()
+    halo = new_hash(variant, size_in_bits)
+    halo.update(tokens)
+    halo.hash()
+    elapsed = timeit.default_timer() - start
+    memory = peak_memory_kb() - memory_before
+
+    # hash documents made of consecutive tokens for latencies
+    length = max(1, len(tokens) // DOCUMENTS)
+    docs = []
+    for start_token in range(0, length * DOCUMENTS, length):
+        doc = new_hash(variant, size_in_bits)
+        doc.update(tokens[start_token:start_token + length])
+        docs.append(doc.hash())
+
+    start = timeit.default_timer()
+    for doc in docs:
+        halohash.hamming_distance(docs[0], doc)
+    distance = (timeit.default_timer() - start) / len(docs)
+
+    index = MultiIndexHash(size_in_bits, substrings=max(1, size_in_bits // 16))
+    for i, doc in enumerate(docs):
+        index.add(i, doc)
+    start = timeit.default_timer()
+    for doc in docs:
+        index.query(doc, max_distance=size_in_bits // 8)
+    query = (timeit.default_timer() - start) / len(docs)
+
+    return dict(
+        tokens_per_second=len(tokens) / max(elapsed, 1e-9),
+        peak_memory_kb=memory,
+        distance_us=distance * 1e6,
+        query_us=query * 1e6,
+    )
+
+
+def failed_case(message):
+    """
+    Return a mapping of benchmark results for a case that failed with an
+    error `message`.
+    """
+    return dict(error=message)
+
+
+def _run_case_in_process(queue, variant, size_in_bits, tokens):
+    try:
+        queue.put(run_case(variant, size_in_bits, tokens))
+    except Exception:
+        queue.put(failed_case(traceback.format_exc()))
+
+
+def run_isolated_case(variant, size_in_bits, tokens, timeout=CASE_TIMEOUT):
+    """
+    Return the results of run_case() run in a new process such that the peak
+    memory is not shared with previous runs. If the case fails, crashes or
+    does not complete in `timeout` seconds, return the results of a failed
+    case instead.
+    """
+    queue = Queue()
+    process = Process(target=_run_case_in_process,
+                      args=(queue, variant, size_in_bits, tokens))
+    process.start()
+    deadline = timeit.default_timer() + timeout
+    result = None
+    while (result is None and process.is_alive()
+           and timeit.default_timer() < deadline):
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            pass
+
+    if result is None:
+        # the result may have been sent just before the process exited
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            pass
+
+    timed_out = result is None and process.is_alive()
+    if timed_out:
+        process.terminate()
+    process.join()
+
+    if timed_out:
+        result = failed_case('Timed out after %d seconds.' % timeout)
+    elif result is None or process.exitcode:
+        # for instance killed when running out of memory
+        result = failed_case('Benchmark process exited with code: %r'
+                             % process.exitcode)
+    return result
+
+
+def run(corpus_sizes=CORPUS_SIZES, variants=None, sizes_in_bits=SIZES_IN_BITS,
+        isolated=True):
+    """
+    Return a JSON-serializable mapping of benchmark results for each corpus
+    size, variant and size in bits. Unsupported combinations are skipped.
+    Cases that fail are reported with an error message instead of metrics.
+    """
+    results = []
+    for tokens_count in corpus_sizes:
+        tokens = corpus(tokens_count)
+        for variant in sorted(variants or VARIANTS):
+            for size_in_bits in sizes_in_bits:
+                if not supported(variant, size_in_bits):
+                    continue
+                if isolated:
+                    metrics = run_isolated_case(variant, size_in_bits, tokens)
+                else:
+                    try:
+                        metrics = run_case(variant, size_in_bits, tokens)
+                    except Exception:
+                        metrics = failed_case(traceback.format_exc())
+                metrics.update(variant=variant, size_in_bits=size_in_bits,
+                               tokens=tokens_count)
+                results.append(metrics)
+
+    return dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results,
+    )
+
+
+def case_key(result):
+    return result['variant'], result['size_in_bits'], result['tokens']
+
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Return a list of regressions as tuples of (variant, size_in_bits, tokens,
+    metric, baseline value, current value) for each metric of a `current`
+    results mapping that is worse than the same metric in a `baseline`
+    results mapping by more than a `tolerance` ratio.
+
+    Cases that failed in `current` are reported with an 'error' metric and
+    cases of `baseline` missing from `current` with a 'missing' metric.
+
+    For example:
+    >>> old = {'results': [dict(variant='v', size_in_bits=32, tokens=10,
+    ...        tokens_per_second=100, distance_us=10)]}
+    >>> new = {'results': [dict(variant='v', size_in_bits=32, tokens=10,
+    ...        tokens_per_second=50, distance_us=11)]}
+    >>> compare(old, new)
+    [('v', 32, 10, 'tokens_per_second', 100, 50)]
+    >>> compare(old, {'results': [dict(variant='v', size_in_bits=32, tokens=10,
+    ...         error='MemoryError')]})
+    [('v', 32, 10, 'error', None, 'MemoryError')]
+    >>> compare(old, {'results': []})
+    [('v', 32, 10, 'missing', None, None)]
+    """
+    baselines = dict((case_key(r), r) for r in baseline['results'])
+    regressions = []
+    for result in current['results']:
+        if 'error' in result:
+            regressions.append(case_key(result) + ('error', None, result['error']))
+            continue
+        old = baselines.get(case_key(result))
+        if not old or 'error' in old:
+            continue
+        for metric, higher_is_better in sorted(METRICS.items()):
+            if metric not in old or metric not in result:
+                continue
+            before = old[metric]
+            after = result[metric]
+            if higher_is_better:
+                regressed = after < before * (1 - tolerance)
+            else:
+                regressed = after > before * (1 + tolerance)
+            if regressed:
+                regressions.append(case_key(result) + (metric, before, after))
+
+    current_keys = set(case_key(r) for r in current['results'])
+    for result in baseline['results']:
+        if case_key(result) not in current_keys:
+            regressions.append(case_key(result) + ('missing', None, None))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark HaloHashes.')
+    parser.add_argument('--output', help='Write JSON results to this file.')
+    parser.add_argument('--baseline',
+        help='Compare results with the JSON results in this file and exit '
+             'with an error on regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help='Ratio by which a metric can be worse than the baseline.')
+    parser.add_argument('--tokens', type=int, action='append',
+        help='Corpus size in tokens. Can be repeated.')
+    parser.add_argument('--variant', action='append', choices=sorted(VARIANTS),
+        help='HaloHash variant. Can be repeated.')
+    parser.add_argument('--bits', type=int, action='append',
+        help='HaloHash size in bits. Can be repeated.')
+    opts = parser.parse_args(args)
+
+    results = run(opts.tokens or CORPUS_SIZES, opts.variant,
+                  opts.bits or SIZES_IN_BITS)
+
+    failed = False
+    for r in results['results']:
+        if 'error' in r:
+            failed = True
+            print('%(variant)-30s %(size_in_bits)4d bits %(tokens)8d tokens: '
+                  'FAILED: %(error)s' % r)
+            continue
+        print('%(variant)-30s %(size_in_bits)4d bits %(tokens)8d tokens: '
+              '%(tokens_per_second)10.0f tokens/s %(peak_memory_kb)8d KB '
+              '%(distance_us)8.2f us/distance %(query_us)8.2f us/query' % r)
+
+    if opts.output:
+        with open(opts.output, 'wb') as out:
+            json.dump(results, out, indent=2, sort_keys=True)
+
+    if opts.baseline:
+        with open(opts.baseline, 'rb') as inp:
+            baseline = json.load(inp)
+        regressions = compare(baseline, results, opts.tolerance)
+        for regression in regressions:
+            print('REGRESSION: %s %d bits %d tokens %s: %r -> %r' % regression)
+        if regressions:
+            return 1
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import sqlite3
+import time
+
+from samecode import hash as commoncode_hash
+from samecode.fingerprint import fingerprint_file
+from samecode.fingerprint import LINES
+
+
+"""
+A persistent on-disk cache of checksums and fingerprints of files.
+
+Cached values are keyed by the device and inode of a file and are valid only
+as long as the file size and modification time are unchanged: for an unchanged
+file, a cache lookup costs a single stat call and a database lookup instead of
+reading and hashing the whole file. The file is stat'ed before computing a
+value such that a value computed while the file is modified is never served.
+
+The cache is stored in an SQLite database. It can be explicitly invalidated
+for a file or cleared. It is bounded to a `max_entries` number of entries:
+when full, the least recently used entries are evicted.
+"""
+
+
+def stat_key(location):
+    """
+    Return a tuple of (device, inode, size, mtime_ns) for the file at
+    `location`.
+    """
+    st = os.stat(location)
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(st.st_mtime * 10 ** 9)
+    return st.st_dev, st.st_ino, st.st_size, mtime_ns
+
+
+class FingerprintCache(object):
+    """
+    A cache of named values computed from the content of files, stored in an
+    SQLite database at `location`. Use as a context manager or call close()
+    when done. Changes are committed on close() or flush().
+    """
+
+    def __init__(self, location, max_entries=1000000):
+        self.location = location
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(location)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'device INTEGER, inode INTEGER, name TEXT, '
+            'size INTEGER, mtime_ns INTEGER, value TEXT, last_access REAL, '
+            'PRIMARY KEY (device, inode, name))')
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS entries_last_access '
+            'ON entries (last_access)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def get_many(self, location, names):
+        """
+        Return a tuple of (key, values) for the file at `location` where key is
+        the stat_key() of the file and values is a mapping of {name: value}
+        for each of the `names` that has a cached value that is not stale.
+        The file is stat'ed once and all its values are fetched at once.
+        """
+        key = stat_key(location)
+        device, inode, size, mtime_ns = key
+        rows = self.db.execute(
+            'SELECT name, size, mtime_ns, value FROM entries '
+            'WHERE device=? AND inode=?', (device, inode)).fetchall()
+
+        if any(row[1] != size or row[2] != mtime_ns for row in rows):
+            # stale entries
+            self.db.execute(
+                'DELETE FROM entries WHERE device=? AND inode=?',
+                (device, inode))
+            rows = []
+
+        cached = dict((row[0], row[3]) for row in rows)
+        values = dict((name, json.loads(cached[name]))
+                      for name in names if name in cached)
+        self.hits += len(values)
+        self.misses += len(names) - len(values)
+        if values:
+            self.db.execute(
+                'UPDATE entries SET last_access=? WHERE device=? AND inode=?',
+                (time.time(), device, inode))
+        return key, values
+
+    def get(self, location, name):
+        """
+        Return the cached `name` value for the file at `location` or None if
+        there is no value or the value is stale.
+        """
+        _key, values = self.get_many(location, [name])
+        return values.get(name)
+
+    def put_many(self, location, values, key=None):
+        """
+        Cache a `values` mapping of {name: value} for the file at `location`.
+        Each value must be serializable as JSON. `key` is the stat_key() of
+        the file taken before computing the values: if the file is modified
+        while its values are computed, they are then stale and never served.
+        If `key` is None, the file is stat'ed now.
+        """
+        device, inode, size, mtime_ns = key or stat_key(location)
+        now = time.time()
+        self.db.executemany(
+            'INSERT OR REPLACE INTO entries '
+            '(device, inode, name, size, mtime_ns, value, last_access) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(device, inode, name, size, mtime_ns, json.dumps(value), now)
+             for name, value in values.items()])
+
+    def put(self, location, name, value, key=None):
+        """
+        Cache a `name` value for the file at `location`. `value` must be
+        serializable as JSON. See put_many() for `key`.
+        """
+        self.put_many(location, {name: value}, key)
+
+    def get_or_compute(self, location, name, compute):
+        """
+        Return the cached `name` value for the file at `location`. If not
+        cached, compute it by calling `compute(location)` and cache it.
+        """
+        key, values = self.get_many(location, [name])
+        value = values.get(name)
+        if value is None:
+            value = compute(location)
+            if value is not None:
+                self.put(location, name, value, key)
+        return value
+
+    def invalidate(self, location):
+        """
+        Remove all the cached values for the file at `location`.
+        """
+        device, inode, _size, _mtime_ns = stat_key(location)
+        self.db.execute(
+            'DELETE FROM entries WHERE device=? AND inode=?', (device, inode))
+
+    def evict(self, max_entries=None):
+        """
+        Evict the least recently used entries to keep at most `max_entries`
+        entries (or the cache `max_entries`). Return the number of evicted
+        entries.
+        """
+        if max_entries is None:
+            max_entries = self.max_entries
+        excess = len(self) - max_entries
+        if excess <= 0:
+            return 0
+        self.db.execute(
+            'DELETE FROM entries WHERE rowid IN ('
+            'SELECT rowid FROM entries ORDER BY last_access LIMIT ?)', (excess,))
+        return excess
+
+    def clear(self):
+        """
+        Remove all the cached values.
+        """
+        self.db.execute('DELETE FROM entries')
+
+    def flush(self):
+        """
+        Evict entries as needed and commit changes to disk.
+        """
+        self.evict()
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def cached_multi_checksum(cache, location,
+                          algorithms=('md5', 'sha1', 'sha256', 'sha512')):
+    """
+    Return a mapping of {algorithm name: hex checksum} for the file at
+    `location` as returned by samecode.hash.multi_checksum(), using a
+    `cache` FingerprintCache. Only checksums missing from the cache are
+    computed.
+    """
+    key, checksums = cache.get_many(location, algorithms)
+    missing = [name for name in algorithms if name not in checksums]
+
+    if missing:
+        computed = commoncode_hash.multi_checksum(location, missing)
+        if computed is None:
+            return
+        values = dict((name, value) for name, value in computed.items()
+                      if value is not None)
+        cache.put_many(location, values, key)
+        checksums.update(computed)
+    return checksums
+
+
+def cached_checksum(cache, location, name):
+    """
+    Return a hex checksum for the file at `location` and the `name` algorithm
+    (as found in samecode.hash.checksum_bitsizes) using a `cache`
+    FingerprintCache.
+    """
+    checksums = cached_multi_checksum(cache, location, [name])
+    return checksums and checksums[name]
+
+
+def cached_fingerprint(cache, location, kind=LINES, ngram=1, size_in_bits=128):
+    """
+    Return a hex HaloHash digest for the file at `location` as computed by
+    samecode.fingerprint.fingerprint_file() using a `cache` FingerprintCache.
+    """
+    name = 'halohash:%(kind)s:%(ngram)d:%(size_in_bits)d' % locals()
+
+    def compute(loc):
+        return fingerprint_file(loc, kind, ngram, size_in_bits).hexdigest()
+
+    return cache.get_or_compute(location, name, compute)
@@ -0,0 +1,174 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from samecode.halohash import as_bitarray
+from samecode.index import MultiIndexHash
+
+
+"""
+Group near-duplicates in a corpus of HaloHash fingerprints.
+
+The clustering processes a stream of (id, hash) pairs one at a time: each hash
+is first queried against an index of the previously seen hashes to find its
+near-duplicates, then added to the index. Each verified near-duplicate pair is
+merged in a union-find structure and the connected components of this
+union-find are the clusters. Candidate pairs are never accumulated: memory
+usage is linear with the number of hashes.
+"""
+
+
+class UnionFind(object):
+    """
+    A union-find (a.k.a. disjoint set) structure of hashable elements with
+    path halving and union by size.
+
+    For example:
+    >>> uf = UnionFind()
+    >>> uf.union('a', 'b')
+    >>> uf.union('c', 'd')
+    >>> uf.union('b', 'd')
+    >>> uf.find('a') == uf.find('c')
+    True
+    >>> uf.add('e')
+    >>> sorted(sorted(g) for g in uf.groups())
+    [['a', 'b', 'c', 'd'], ['e']]
+    """
+
+    def __init__(self):
+        self.parents = {}
+        self.sizes = {}
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add(self, element):
+        if element not in self.parents:
+            self.parents[element] = element
+            self.sizes[element] = 1
+
+    def find(self, element):
+        """
+        Return the root of the set of `element`.
+        """
+        self.add(element)
+        parents = self.parents
+        while parents[element] != element:
+            parents[element] = parents[parents[element]]
+            element = parents[element]
+        return element
+
+    def union(self, element1, element2):
+        """
+        Merge the sets of `element1` and `element2`.
+        """
+        root1 = self.find(element1)
+        root2 = self.find(element2)
+        if root1 == root2:
+            return
+        if self.sizes[root1] < self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        self.sizes[root1] += self.sizes.pop(root2)
+
+    def groups(self):
+        """
+        Return a list of lists of elements, one for each set.
+        """
+        groups = {}
+        for element in self.parents:
+            groups.setdefault(self.find(element), []).append(element)
+        return groups.values()
+
+
+def near_duplicate_pairs(items, max_distance, index=None):
+    """
+    Yield (id1, id2, distance) tuples for each pair of hashes within
+    `max_distance` Hamming distance in an `items` iterable of (id, hash) pairs,
+    where id1 was seen before id2. A hash is either a HaloHash instance, a
+    bitarray or a binary digest string.
+
+    `index` is an empty index with add(id, hash) and query(hash, max_distance)
+    methods such as a samecode.index.MultiIndexHash (the default, for exact
+    results) or a samecode.index.HaloIndex (for approximate but faster
+    results).
+
+    For example:
+    >>> from bitarray import bitarray
+    >>> items = [(1, bitarray('11110000')), (2, bitarray('11110001')),
+    ...          (3, bitarray('00001111')), (4, bitarray('11110011'))]
+    >>> list(near_duplicate_pairs(items, 1))
+    [(1, 2, 1), (2, 4, 1)]
+    """
+    for hid, halo in items:
+        bits = as_bitarray(halo)
+        if index is None:
+            index = default_index(len(bits))
+        for matched, distance in index.query(bits, max_distance):
+            yield matched, hid, distance
+        index.add(hid, bits)
+
+
+def default_index(size_in_bits):
+    """
+    Return a new exact index for hashes of `size_in_bits` using substrings of
+    16 bits or less.
+    """
+    substrings = (size_in_bits + 15) // 16
+    while size_in_bits % substrings:
+        substrings += 1
+    return MultiIndexHash(size_in_bits=size_in_bits, substrings=substrings)
+
+
+def cluster(items, max_distance, index=None, min_size=2):
+    """
+    Yield clusters of near-duplicates as sorted lists of ids from an `items`
+    iterable of (id, hash) pairs. Two hashes within `max_distance` Hamming
+    distance are in the same cluster, and so are (transitively) their
+    near-duplicates. Only yield clusters of at least `min_size` ids. See
+    near_duplicate_pairs() for the `index` argument.
+
+    For example:
+    >>> from bitarray import bitarray
+    >>> items = [(1, bitarray('11110000')), (2, bitarray('11110001')),
+    ...          (3, bitarray('00001111')), (4, bitarray('11110011'))]
+    >>> list(cluster(items, 1))
+    [[1, 2, 4]]
+    >>> list(cluster(items, 1, min_size=1))
+    [[1, 2, 4], [3]]
+    """
+    clusters = UnionFind()
+
+    def track(items):
+        for hid, halo in items:
+            clusters.add(hid)
+            yield hid, halo
+
+    for hid1, hid2, _distance in near_duplicate_pairs(track(items), max_distance, index):
+        clusters.union(hid1, hid2)
+
+    groups = (sorted(group) for group in clusters.groups() if len(group) >= min_size)
+    for group in sorted(groups):
+        yield group
@@ -0,0 +1,221 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from collections import namedtuple
+import struct
+
+from samecode.halohash import as_digest
+
+
+"""
+A compact binary container for collections of HaloHashes, used to exchange
+fingerprints between processes or machines.
+
+A container is a stream made of a header followed by records:
+
+- the header has a magic string, a format version, the name of the HaloHash
+  class (as a length-prefixed string) and the size in bits of the hashes.
+  All the hashes of a container have the same class and size and can be
+  compared.
+
+- each record has the length of its id, the number of elements hashed, the
+  id and the raw digest bytes.
+
+All integers are little-endian. Containers are written and read as streams
+with bounded memory: the number of records is not known in advance and the
+stream ends after the last record.
+"""
+
+MAGIC = b'HALOPACK'
+VERSION = 2
+# magic, format version
+HEADER = struct.Struct('<8sH')
+# length of a string
+STRING = struct.Struct('<H')
+# size in bits
+SIZE = struct.Struct('<I')
+# id length, elements count
+RECORD = struct.Struct('<IQ')
+
+
+Record = namedtuple('Record', 'id digest elements_count')
+
+
+def _write_string(output, s):
+    s = s.encode('utf-8') if isinstance(s, unicode) else s
+    output.write(STRING.pack(len(s)) + s)
+
+
+def _read(input, size):
+    """
+    Return exactly `size` bytes read from `input`. Raise a ValueError on a
+    truncated stream.
+    """
+    data = input.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated HaloHash container.')
+    return data
+
+
+def _read_string(input):
+    length, = STRING.unpack(_read(input, STRING.size))
+    return _read(input, length)
+
+
+class ContainerWriter(object):
+    """
+    Write a container of HaloHashes of a `hash_type` class name and
+    `size_in_bits` to an `output` file-like object or file location. Use as
+    a context manager or call close() when done.
+    """
+
+    def __init__(self, output, hash_type, size_in_bits):
+        self.hash_type = hash_type
+        self.size_in_bits = size_in_bits
+        self.digest_size = size_in_bits // 8
+        self.count = 0
+
+        self._close_output = isinstance(output, basestring)
+        if self._close_output:
+            output = open(output, 'wb')
+        self.output = output
+
+        output.write(HEADER.pack(MAGIC, VERSION))
+        _write_string(output, hash_type)
+        output.write(SIZE.pack(size_in_bits))
+
+    @classmethod
+    def for_hash(cls, output, halo):
+        """
+        Return a writer for HaloHashes with the same class and size as a
+        `halo` HaloHash instance.
+        """
+        return cls(output, type(halo).__name__, halo.size_in_bits)
+
+    def add(self, hid, halo, elements_count=None):
+        """
+        Add a `halo` hash with the `hid` id. `halo` is either a HaloHash
+        instance, a bitarray or a binary digest string. The number of hashed
+        elements is taken from a HaloHash instance unless an `elements_count`
+        is provided.
+        """
+        if hasattr(halo, 'elements_count'):
+            if (type(halo).__name__ != self.hash_type
+                or halo.size_in_bits != self.size_in_bits):
+                raise ValueError('Incompatible HaloHash for this container.')
+            if elements_count is None:
+                elements_count = halo.elements_count()
+
+        digest = as_digest(halo)
+        if len(digest) != self.digest_size:
+            raise ValueError(
+                'Invalid digest size: %d. Expected: %d' % (
+                len(digest), self.digest_size))
+        hid = hid.encode('utf-8') if isinstance(hid, unicode) else str(hid)
+        self.output.write(RECORD.pack(len(hid), elements_count or 0))
+        self.output.write(hid)
+        self.output.write(digest)
+        self.count += 1
+
+    def close(self):
+        if self._close_output:
+            self.output.close()
+        else:
+            self.output.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ContainerReader(object):
+    """
+    Read a container of HaloHashes from an `input` file-like object or file
+    location. Iterate to get Records of (id, digest, elements_count). Use as
+    a context manager or call close() when done.
+    """
+
+    def __init__(self, input):
+        self._close_input = isinstance(input, basestring)
+        if self._close_input:
+            input = open(input, 'rb')
+        self.input = input
+
+        magic, version = HEADER.unpack(_read(input, HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('Invalid HaloHash container.')
+        if version != VERSION:
+            raise ValueError('Unsupported HaloHash container version: '
+                             '%(version)d' % locals())
+        self.hash_type = _read_string(input)
+        self.size_in_bits, = SIZE.unpack(_read(input, SIZE.size))
+        self.digest_size = self.size_in_bits // 8
+
+    def __iter__(self):
+        input = self.input
+        digest_size = self.digest_size
+        while True:
+            header = input.read(RECORD.size)
+            if not header:
+                return
+            if len(header) != RECORD.size:
+                raise ValueError('Truncated HaloHash container.')
+            id_length, elements_count = RECORD.unpack(header)
+            hid = _read(input, id_length)
+            yield Record(hid, _read(input, digest_size), elements_count)
+
+    def close(self):
+        if self._close_input:
+            self.input.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def dump(output, items, hash_type, size_in_bits):
+    """
+    Write a container to an `output` file-like object or location for an
+    `items` iterable of (id, hash) tuples. Return the number of items written.
+    """
+    with ContainerWriter(output, hash_type, size_in_bits) as writer:
+        for hid, halo in items:
+            writer.add(hid, halo)
+    return writer.count
+
+
+def load(input):
+    """
+    Yield Records from a container read from an `input` file-like object or
+    location.
+    """
+    with ContainerReader(input) as reader:
+        for record in reader:
+            yield record
@@ -0,0 +1,230 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from multiprocessing import Pool
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from samecode.halohash import as_digest
+
+
+"""
+Batched Hamming distances between many HaloHashes.
+
+Hashes are packed as rows of 64 bits words in numpy arrays and distances are
+computed for blocks of query and reference rows at once using a vectorized
+XOR and bit count rather than one Python call per pair of hashes. Blocks are
+bounded in size to bound memory usage and query blocks can optionally be
+processed in parallel in a pool of processes.
+"""
+
+# default number of rows of queries and references processed in one block
+CHUNK_SIZE = 512
+
+
+def _check_numpy():
+    if numpy is None:
+        raise ImportError('numpy is required for batched distances.')
+
+
+def pack_words(hashes):
+    """
+    Return a numpy uint64 array with one row of 64 bits words for each hash of
+    a `hashes` sequence. Each hash is either a HaloHash instance, a bitarray or
+    a binary digest string and all hashes must have the same length. Digests
+    are padded with zero bytes to a multiple of 8 bytes. A 2-D uint64 numpy
+    array is returned as-is.
+    """
+    _check_numpy()
+    if isinstance(hashes, numpy.ndarray) and hashes.dtype == numpy.uint64:
+        return hashes
+
+    digests = [as_digest(h) for h in hashes]
+    if not digests:
+        return numpy.zeros((0, 0), dtype=numpy.uint64)
+
+    size = len(digests[0])
+    if any(len(d) != size for d in digests):
+        raise ValueError('All hashes must have the same length.')
+    padding = b'\0' * (-size % 8)
+    packed = b''.join(d + padding for d in digests)
+    words = (size + len(padding)) // 8
+    return numpy.frombuffer(packed, dtype=numpy.uint64).reshape(len(digests), words)
+
+
+def popcount(words):
+    """
+    Return a numpy array with the number of bits set in each element of a
+    `words` numpy uint64 array, using a parallel bit count.
+    """
+    words = words - ((words >> numpy.uint64(1)) & numpy.uint64(0x5555555555555555))
+    words = ((words & numpy.uint64(0x3333333333333333))
+             + ((words >> numpy.uint64(2)) & numpy.uint64(0x3333333333333333)))
+    words = (words + (words >> numpy.uint64(4))) & numpy.uint64(0x0f0f0f0f0f0f0f0f)
+    return (words * numpy.uint64(0x0101010101010101)) >> numpy.uint64(56)
+
+
+def _block_distances(queries, references):
+    """
+    Return an (N, M) int32 array of distances between `queries` (N, W) and
+    `references` (M, W) packed uint64 arrays.
+    """
+    xored = numpy.bitwise_xor(queries[:, numpy.newaxis, :], references[numpy.newaxis, :, :])
+    return popcount(xored).sum(axis=2, dtype=numpy.int32)
+
+
+def _chunk_distances(queries, references, chunk_size):
+    """
+    Return an array of distances between `queries` and all `references`
+    processed in blocks of `chunk_size` references.
+    """
+    distances = numpy.empty((len(queries), len(references)), dtype=numpy.int32)
+    for start in range(0, len(references), chunk_size):
+        end = start + chunk_size
+        distances[:, start:end] = _block_distances(queries, references[start:end])
+    return distances
+
+
+def _chunk_top_k(queries, references, k, chunk_size):
+    """
+    Return a tuple of (indices, distances) arrays of the `k` nearest
+    `references` for each of `queries`, keeping only the best `k` candidates
+    while scanning blocks of `chunk_size` references.
+    """
+    count = len(references)
+    best_keys = numpy.zeros((len(queries), 0), dtype=numpy.int64)
+    for start in range(0, count, chunk_size):
+        end = start + chunk_size
+        distances = _block_distances(queries, references[start:end])
+        # a unique key sorting by distance then reference index
+        keys = distances.astype(numpy.int64) * count + numpy.arange(start, start + distances.shape[1])
+        keys = numpy.concatenate((best_keys, keys), axis=1)
+        if keys.shape[1] > k:
+            keys = numpy.partition(keys, k - 1, axis=1)[:, :k]
+        best_keys = keys
+    best_keys.sort(axis=1)
+    return best_keys % count, best_keys // count
+
+
+# references shared by all the tasks of a pool worker process
+_worker_references = None
+
+
+def _init_worker(references):
+    global _worker_references
+    _worker_references = references
+
+
+def _distances_task(args):
+    queries, chunk_size = args
+    return _chunk_distances(queries, _worker_references, chunk_size)
+
+
+def _top_k_task(args):
+    queries, k, chunk_size = args
+    return _chunk_top_k(queries, _worker_references, k, chunk_size)
+
+
+def _map_chunks(task, queries, references, chunk_size, processes, *args):
+    """
+    Return a list of the results of running a `task` function for each chunk
+    of `chunk_size` `queries` rows, using a pool of `processes` processes if
+    `processes` is more than one.
+    """
+    chunks = [(queries[start:start + chunk_size],) + args + (chunk_size,)
+              for start in range(0, len(queries), chunk_size)]
+
+    if processes and processes > 1:
+        pool = Pool(processes, initializer=_init_worker, initargs=(references,))
+        try:
+            return pool.map(task, chunks)
+        finally:
+            pool.terminate()
+
+    _init_worker(references)
+    try:
+        return map(task, chunks)
+    finally:
+        _init_worker(None)
+
+
+def distance_matrix(queries, references, chunk_size=CHUNK_SIZE, processes=None):
+    """
+    Return an (N, M) numpy int32 array of the Hamming distances between each
+    of the N `queries` hashes and each of the M `references` hashes.
+
+    `queries` and `references` are sequences of hashes as accepted by
+    pack_words() or packed uint64 arrays. The distances are computed in blocks
+    of `chunk_size` queries by `chunk_size` references. If `processes` is more
+    than one, blocks of queries are processed in a pool of that many processes.
+
+    For example:
+    >>> from bitarray import bitarray
+    >>> q = [bitarray('11110000'), bitarray('00000000')]
+    >>> r = [bitarray('11110000'), bitarray('00001111'), bitarray('10000000')]
+    >>> distance_matrix(q, r).tolist()
+    [[0, 8, 3], [4, 4, 1]]
+    """
+    queries = pack_words(queries)
+    references = pack_words(references)
+    if not len(queries) or not len(references):
+        return numpy.zeros((len(queries), len(references)), dtype=numpy.int32)
+
+    results = _map_chunks(_distances_task, queries, references, chunk_size, processes)
+    return numpy.concatenate(results, axis=0)
+
+
+def top_k(queries, references, k, chunk_size=CHUNK_SIZE, processes=None):
+    """
+    Return a tuple of two (N, k) numpy arrays (indices, distances) for the
+    indices and distances of the `k` nearest `references` for each of the N
+    `queries`, sorted by increasing distance then reference index. `k` is
+    capped to the number of references. Other arguments are the same as for
+    distance_matrix(). Memory usage is bounded by the block size regardless of
+    the number of references.
+
+    For example:
+    >>> from bitarray import bitarray
+    >>> q = [bitarray('11110000'), bitarray('00000000')]
+    >>> r = [bitarray('11110000'), bitarray('00001111'), bitarray('10000000')]
+    >>> indices, distances = top_k(q, r, k=2)
+    >>> indices.tolist(), distances.tolist()
+    ([[0, 2], [2, 0]], [[0, 3], [1, 4]])
+    """
+    queries = pack_words(queries)
+    references = pack_words(references)
+    k = min(k, len(references))
+    if not len(queries) or not k:
+        empty = numpy.zeros((len(queries), k), dtype=numpy.int64)
+        return empty, empty.copy()
+
+    results = _map_chunks(_top_k_task, queries, references, chunk_size, processes, k)
+    indices = numpy.concatenate([i for i, _ in results], axis=0)
+    distances = numpy.concatenate([d for _, d in results], axis=0)
+    return indices, distances
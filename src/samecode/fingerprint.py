@@ -0,0 +1,176 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from collections import deque
+from itertools import islice
+import re
+
+from samecode.halohash import BitAverageHaloHash
+
+
+"""
+Compute HaloHash fingerprints of files.
+
+The content of a file is streamed through a pipeline of generators: tokens
+are lines, words or bytes which are optionally grouped in k-shingles (e.g.
+sliding ngrams of consecutive tokens) and hashed in batches in a streaming
+HaloHash. The memory used is bounded whatever the size of a file.
+"""
+
+# kinds of tokens
+LINES = 'lines'
+WORDS = 'words'
+BYTES = 'bytes'
+
+# size of the chunks of bytes read at once for words and bytes tokens
+CHUNK_SIZE = 2 ** 16
+
+# lines and words longer than this number of bytes are split in pieces such
+# that a file without line breaks or spaces is never loaded in memory at once
+MAX_TOKEN_LENGTH = 2 ** 16
+
+words_splitter = re.compile(r'\w+').finditer
+
+
+def lines(location):
+    """
+    Yield stripped non-empty lines from the file at `location`. Lines longer
+    than MAX_TOKEN_LENGTH are split in pieces of MAX_TOKEN_LENGTH bytes.
+    """
+    with open(location, 'rb') as f:
+        while True:
+            line = f.readline(MAX_TOKEN_LENGTH)
+            if not line:
+                break
+            line = line.strip()
+            if line:
+                yield line
+
+
+def words(location):
+    """
+    Yield words from the file at `location`. Words longer than
+    MAX_TOKEN_LENGTH are split in pieces of MAX_TOKEN_LENGTH bytes.
+    """
+    tail = b''
+    with open(location, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data = tail + chunk
+            tail = b''
+            end = len(data)
+            for match in words_splitter(data):
+                word = match.group()
+                # a word at the end of a chunk may continue in the next chunk
+                while len(word) >= MAX_TOKEN_LENGTH:
+                    yield word[:MAX_TOKEN_LENGTH]
+                    word = word[MAX_TOKEN_LENGTH:]
+                if match.end() == end:
+                    tail = word
+                elif word:
+                    yield word
+    if tail:
+        yield tail
+
+
+def byte_ngrams(location, ngram):
+    """
+    Yield sliding `ngram` strings of bytes from the file at `location`.
+    """
+    overlap = ngram - 1
+    tail = b''
+    with open(location, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data = tail + chunk
+            for i in xrange(len(data) - overlap):
+                yield data[i:i + ngram]
+            tail = overlap and data[-overlap:] or b''
+
+
+def shingles(tokens, ngram, separator=b' '):
+    """
+    Yield strings joined with `separator` for each sliding `ngram` of
+    `tokens` from an iterable of tokens. If there are fewer tokens than
+    `ngram`, yield a single string for all the tokens.
+
+    For example:
+    >>> list(shingles(['a', 'b', 'c', 'd'], 3))
+    ['a b c', 'b c d']
+    >>> list(shingles(['a', 'b'], 3))
+    ['a b']
+    >>> list(shingles([], 3))
+    []
+    """
+    tokens = iter(tokens)
+    window = deque(islice(tokens, ngram), maxlen=ngram)
+    if not window:
+        return
+    yield separator.join(window)
+    for token in tokens:
+        window.append(token)
+        yield separator.join(window)
+
+
+def tokens(location, kind=LINES, ngram=1):
+    """
+    Return an iterable of tokens from the file at `location` where `kind` is
+    one of lines, words or bytes. Line and word tokens are grouped in sliding
+    shingles of `ngram` tokens. Bytes tokens are sliding `ngram` strings of
+    bytes.
+    """
+    if ngram < 1:
+        raise ValueError('ngram must be at least 1: %(ngram)r' % locals())
+
+    if kind == BYTES:
+        return byte_ngrams(location, ngram)
+    elif kind == LINES:
+        toks, separator = lines(location), b'\n'
+    elif kind == WORDS:
+        toks, separator = words(location), b' '
+    else:
+        raise ValueError('Unknown kind of tokens: %(kind)r' % locals())
+
+    if ngram == 1:
+        return toks
+    return shingles(toks, ngram, separator)
+
+
+def fingerprint_file(location, kind=LINES, ngram=1, size_in_bits=128,
+                     hash_class=BitAverageHaloHash):
+    """
+    Return a streaming `hash_class` HaloHash of `size_in_bits` computed from
+    the tokens of the file at `location`. See tokens() for `kind` and `ngram`.
+    `hash_class` must support a streaming mode such as a BitAverageHaloHash
+    or BitQuartileHaloHash.
+    """
+    halo = hash_class(size_in_bits=size_in_bits, streaming=True)
+    halo.update(tokens(location, kind, ngram))
+    return halo
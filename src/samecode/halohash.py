@@ -24,12 +24,18 @@
 
 from __future__ import absolute_import, print_function, division
 
-from itertools import imap, izip
+from binascii import hexlify
+from itertools import imap, islice, izip
 import math
 
 from bitarray import bitarray
 from bitarray import bitdiff
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from commoncode import codec
 
 # FIXME: temporary hack to work around missing feature in scancode 2.0.0rc2
@@ -199,7 +205,10 @@ class BaseHaloHash(object):
     def elements_count(self):
         return len(self.hashes)
 
-    def __hashup(self, msg):
+    def _hashup(self, msg):
+        """
+        Hash and accumulate a single `msg` string.
+        """
         self.hashes.append(self.hashmodule(msg))
 
     def update(self, msg):
@@ -209,10 +218,10 @@ class BaseHaloHash(object):
         if not msg:
             return
         if isinstance(msg, basestring):
-            self.__hashup(msg)
+            self._hashup(msg)
         else:
             for m in msg:
-                self.__hashup(m)
+                self._hashup(m)
 
     def hash(self, msg=None):
         """
@@ -244,9 +253,12 @@ class BaseHaloHash(object):
 
     def intdigest(self):
         """
-        Return an integer or long representing this hash.
+        Return an integer or long representing this hash, converted from the
+        packed bytes of digest().
         """
-        return bit_to_num(self.hash())
+        bits = self.hash()
+        # the last byte of the digest is padded with zero low bits
+        return bytes_to_num(bits.tobytes()) >> (-len(bits) % 8)
 
     def digest(self):
         """
@@ -260,6 +272,63 @@ class BaseHaloHash(object):
         """
         return int(bitdiff(self.hash(), other.hash()))
 
+    def state(self):
+        """
+        Return a mapping of plain types (and therefore serializable for
+        instance as JSON) representing the accumulated state of this hash.
+        A hash can be recreated from a state with `from_state()`.
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Return a new hash built from a `state` mapping as returned by
+        `state()`.
+        """
+        if state.get('type') != cls.__name__:
+            raise ValueError(
+                'Cannot build a %s from a state of type: %r'
+                % (cls.__name__, state.get('type')))
+        halo = cls(size_in_bits=state['size_in_bits'])
+        halo._combine(state, 1)
+        return halo
+
+    def merge(self, other):
+        """
+        Merge the accumulated state of an `other` hash of the same type and
+        size in this hash. The resulting hash is the same as if all the
+        elements of `other` had been added to this hash.
+        """
+        self._check_compatible(other)
+        self._combine(other.state(), 1)
+
+    def subtract(self, other):
+        """
+        Subtract the accumulated state of an `other` hash of the same type and
+        size from this hash. The resulting hash is the same as if the elements
+        of `other` had never been added to this hash. `other` elements must
+        have been added or merged in this hash before.
+        """
+        self._check_compatible(other)
+        self._combine(other.state(), -1)
+
+    def _check_compatible(self, other):
+        if (type(self) != type(other)
+            or self.size_in_bits != other.size_in_bits):
+            raise ValueError(
+                'Incompatible hashes: %s(size_in_bits=%d) and '
+                '%s(size_in_bits=%d)' % (
+                type(self).__name__, self.size_in_bits,
+                type(other).__name__, other.size_in_bits))
+
+    def _combine(self, state, sign):
+        """
+        Add (if `sign` is 1) or subtract (if `sign` is -1) a `state` mapping
+        to the accumulated state of this hash.
+        """
+        raise NotImplementedError()
+
 
 class BaseBucketHaloHash(BaseHaloHash):
     """
@@ -288,33 +357,68 @@ class BaseBucketHaloHash(BaseHaloHash):
         self.lowmax = maxint
 
         self.digest_size = size_in_bits // 8
+        self.size_in_bits = size_in_bits
+
+        # accumulated sums of low bits values and count of elements for each
+        # bucket for merged or subtracted states
+        self.bucket_totals = [0] * self.number_of_buckets
+        self.bucket_counts = [0] * self.number_of_buckets
 
         self.update(msg)
 
+    def elements_count(self):
+        return len(self.hashes) + sum(self.bucket_counts)
+
+    def bucket_sums(self):
+        """
+        Return a tuple of two lists (totals, counts) with the sum of the
+        values of the low bits of the hashes and the number of hashes for each
+        bucket.
+        """
+        totals = list(self.bucket_totals)
+        counts = list(self.bucket_counts)
+        if self.hashes:
+            digests = [h.digest() for h in self.hashes]
+            sums, nums = sum_buckets(digests, self.high)
+            totals = [t + s for t, s in izip(totals, sums)]
+            counts = [c + n for c, n in izip(counts, nums)]
+        return totals, counts
+
+    def state(self):
+        totals, counts = self.bucket_sums()
+        return dict(
+            type=type(self).__name__,
+            size_in_bits=self.size_in_bits,
+            elements_count=sum(counts),
+            bucket_totals=totals,
+            bucket_counts=counts,
+        )
+
+    def _combine(self, state, sign):
+        totals, counts = self.bucket_sums()
+        totals = [t + sign * o for t, o in izip(totals, state['bucket_totals'])]
+        counts = [c + sign * o for c, o in izip(counts, state['bucket_counts'])]
+        if any(c < 0 for c in counts) or any(t < 0 for t in totals):
+            raise ValueError('Cannot subtract a state that was never added.')
+        self.bucket_totals = totals
+        self.bucket_counts = counts
+        self.hashes = []
+
     def build_buckets(self):
         """
         Return a list of buckets splitting high and low using bit shifts and
         group by high.
         """
-        # FIXME use a defaultdict(list)
-        hash_buckets = {}
+        buckets = [None] * self.number_of_buckets
+        low = self.low
         for h in self.hashes:
-            hbv = bitarray_from_bytes(h.digest())
-            hi = bit_to_num(hbv[0:self.high])
-            lo = hbv[self.high:]
-            try:
-                hash_buckets[hi].append(lo)
-            except KeyError:
-                hash_buckets[hi] = []
-                hash_buckets[hi].append(lo)
-        buckets = []
-        # TODO: are we off by one on this range?
-        for i in range(self.number_of_buckets):
-            try:
-                buck = hash_buckets[i]
-                buckets.append(buck)
-            except KeyError:
-                buckets.append(None)
+            digest = h.digest()
+            hi = bytes_to_num(digest) >> low
+            lo = bitarray_from_bytes(digest)[self.high:]
+            if buckets[hi] is None:
+                buckets[hi] = [lo]
+            else:
+                buckets[hi].append(lo)
         return buckets
 
 
@@ -442,14 +546,12 @@ class BucketAverageHaloHash(BaseBucketHaloHash):
         """
         Compute the bucket average hash and return a bit array.
         """
-        hashes_buckets = self.build_buckets()
+        totals, counts = self.bucket_sums()
         hashvector = bitarray()
 
-        for lo in hashes_buckets:
-            if lo:
-                low = map(bit_to_num, lo)
-                low_mean = len(low) * self.lowmax / 2
-                total = low and sum(low) or 0
+        for total, count in izip(totals, counts):
+            if count:
+                low_mean = count * self.lowmax / 2
                 if total > low_mean:
                     hashvector.append(1)
                 else:
@@ -463,24 +565,157 @@ class BaseBitMatrixHaloHash(BaseHaloHash):
     """
     Base class for hash using bit matrices.
     """
-    def __init__(self, msg=None, size_in_bits=128):
+    # number of element digests buffered in streaming mode before they are
+    # folded in the running column totals
+    flush_size = 1024
+
+    def __init__(self, msg=None, size_in_bits=128, streaming=False):
+        """
+        If `streaming` is True, the hashes of each element are not kept in
+        `self.hashes`. Instead only a running sum of bits for each column and
+        the number of hashed elements are kept. This uses a constant amount of
+        memory regardless of the number of elements and yields exactly the
+        same hashes. Sequences of elements are also hashed in batches.
+        """
         super(BaseBitMatrixHaloHash, self).__init__()
         try:
             self.hashmodule = commoncode_hash.get_hasher(size_in_bits)
         except:
             raise Exception('No available hash module for the requested '
                             'hash size in bits: %(size_in_bits)d' % locals())
+
+        self.size_in_bits = size_in_bits
+        self.streaming = streaming
+        self.column_totals = [0] * (self.hashmodule().digest_size * 8)
+        self.hashed_elements = 0
+        self.pending_digests = []
+
         self.update(msg)
         self.digest_size = size_in_bits // 8
 
+    def update(self, msg):
+        """
+        Append a string or sequence of strings to the hash.
+        """
+        if not self.streaming or not msg or isinstance(msg, basestring):
+            return super(BaseBitMatrixHaloHash, self).update(msg)
+
+        for digest in commoncode_hash.hash_many(msg, self.hashmodule):
+            self.pending_digests.append(digest)
+            if len(self.pending_digests) >= self.flush_size:
+                self._flush()
+
+    def _hashup(self, msg):
+        if not self.streaming:
+            return super(BaseBitMatrixHaloHash, self)._hashup(msg)
+        self.pending_digests.append(self.hashmodule(msg).digest())
+        if len(self.pending_digests) >= self.flush_size:
+            self._flush()
+
+    def _flush(self):
+        """
+        Fold the pending digests in the running column totals.
+        """
+        if not self.pending_digests:
+            return
+        sums = column_sums(self.pending_digests)
+        self.column_totals = [t + s for t, s in izip(self.column_totals, sums)]
+        self.hashed_elements += len(self.pending_digests)
+        self.pending_digests = []
+
+    def elements_count(self):
+        if not self.streaming:
+            return super(BaseBitMatrixHaloHash, self).elements_count()
+        return self.hashed_elements + len(self.pending_digests)
+
     def sum_columns(self):
         """
         Return an iterable of the sum of bits for each column.
         """
-        arrays = (bitarray_from_bytes(h.digest()) for h in self.hashes)
-        transposed = izip(*arrays)
-        summed = imap(sum, transposed)
-        return summed
+        if not self.streaming:
+            return column_sums([h.digest() for h in self.hashes])
+
+        self._flush()
+        if not self.hashed_elements:
+            return []
+        return list(self.column_totals)
+
+    def state(self):
+        if self.streaming:
+            self._flush()
+            totals = list(self.column_totals)
+        else:
+            totals = self.sum_columns() or [0] * len(self.column_totals)
+        return dict(
+            type=type(self).__name__,
+            size_in_bits=self.size_in_bits,
+            elements_count=self.elements_count(),
+            column_totals=totals,
+        )
+
+    def _start_streaming(self):
+        """
+        Switch to streaming mode to accumulate running totals.
+        """
+        if not self.streaming:
+            self.pending_digests = [h.digest() for h in self.hashes]
+            self.hashes = []
+            self.streaming = True
+        self._flush()
+
+    def update_weighted(self, msg, weight):
+        """
+        Append a `msg` string to the hash counted as `weight` elements. This
+        yields the same hash as appending `msg` `weight` times.
+        """
+        self.update_weights([(msg, weight)])
+
+    def update_weights(self, weights):
+        """
+        Append weighted strings to the hash from a `weights` mapping of
+        {string: weight} or iterable of (string, weight) tuples, where a
+        weight is a non-negative integer such as the frequency of a term. This
+        yields the same hash as appending each string `weight` times but
+        hashes each string only once. The hash is switched to streaming mode.
+
+        For example:
+        >>> a = BitAverageHaloHash(['a', 'a', 'b', 'c', 'c', 'c'], size_in_bits=32)
+        >>> b = BitAverageHaloHash(size_in_bits=32)
+        >>> b.update_weights({'a': 2, 'b': 1, 'c': 3})
+        >>> a.hexdigest() == b.hexdigest()
+        True
+        >>> b.elements_count()
+        6
+        """
+        if hasattr(weights, 'items'):
+            weights = weights.items()
+        self._start_streaming()
+
+        weights = iter(weights)
+        while True:
+            chunk = list(islice(weights, self.flush_size))
+            if not chunk:
+                return
+            if any(not isinstance(w, (int, long)) or w < 0 for _m, w in chunk):
+                raise ValueError('Weights must be non-negative integers.')
+            batch = [(m, w) for m, w in chunk if m and w]
+            if not batch:
+                continue
+            msgs, counts = zip(*batch)
+            digests = list(commoncode_hash.hash_many(msgs, self.hashmodule))
+            sums = column_sums(digests, weights=counts)
+            self.column_totals = [t + s for t, s in izip(self.column_totals, sums)]
+            self.hashed_elements += sum(counts)
+
+    def _combine(self, state, sign):
+        self._start_streaming()
+
+        totals = [t + sign * o for t, o in izip(self.column_totals, state['column_totals'])]
+        count = self.hashed_elements + sign * state['elements_count']
+        if count < 0 or any(t < 0 for t in totals):
+            raise ValueError('Cannot subtract a state that was never added.')
+        self.column_totals = totals
+        self.hashed_elements = count
 
 
 class BitAverageHaloHash(BaseBitMatrixHaloHash):
@@ -606,7 +841,7 @@ class BitAverageHaloHash(BaseBitMatrixHaloHash):
         same.
         """
         col_sums = self.sum_columns()
-        mean = len(self.hashes) / 2
+        mean = self.elements_count() / 2
         averaged = (total > mean for total in col_sums)
         return bitarray(averaged)
 
@@ -719,9 +954,10 @@ class BitQuartileHaloHash(BaseBitMatrixHaloHash):
     50
     """
 
-    def __init__(self, msg=None, size_in_bits=128):
+    def __init__(self, msg=None, size_in_bits=128, streaming=False):
         # we use 2 bits per column, so we use half the size for hashing
-        super(BitQuartileHaloHash, self).__init__(msg, size_in_bits=size_in_bits / 2)
+        super(BitQuartileHaloHash, self).__init__(
+            msg, size_in_bits=size_in_bits / 2, streaming=streaming)
         # but we will still return the proper size
         self.digest_size = size_in_bits // 8
         self.size_in_bits = size_in_bits
@@ -761,7 +997,7 @@ class BitQuartileHaloHash(BaseBitMatrixHaloHash):
         Return a three tuple for the boundaries of each quartile, computed based
         on the number of hashed elements.
         """
-        quart = len(self.hashes) / 4
+        quart = self.elements_count() / 4
         return quart, quart * 2, quart * 3
 
 
@@ -774,6 +1010,192 @@ def bitarray_from_bytes(b):
     return a
 
 
+def as_bitarray(h):
+    """
+    Return a bitarray from `h` that is either a HaloHash instance, a bitarray
+    or a binary digest string.
+
+    For example:
+    >>> as_bitarray('\\x0f')
+    bitarray('00001111')
+    >>> as_bitarray(bitarray('0101'))
+    bitarray('0101')
+    """
+    if isinstance(h, bitarray):
+        return h
+    if isinstance(h, bytes):
+        return bitarray_from_bytes(h)
+    return h.hash()
+
+
+def as_digest(h):
+    """
+    Return a binary digest string from `h` that is either a HaloHash instance,
+    a bitarray or a binary digest string.
+
+    For example:
+    >>> as_digest(bitarray('00001111')) == '\\x0f'
+    True
+    """
+    if isinstance(h, bytes):
+        return h
+    if isinstance(h, bitarray):
+        return h.tobytes()
+    return h.digest()
+
+
+def column_sums(digests, use_numpy=True, weights=None):
+    """
+    Return a list of the sum of bits for each column of the bit matrix where
+    each row is one of the `digests` byte strings. All digests must have the
+    same length. Return an empty list if there are no digests. If a
+    `weights` sequence of integers is provided, each row is counted as many
+    times as its weight.
+
+    Use a vectorized numpy implementation if numpy is available and
+    `use_numpy` is True or a pure Python implementation otherwise. Both
+    return the same results.
+
+    For example:
+    >>> column_sums(['\\x0f', '\\xff', '\\x01'], use_numpy=False)
+    [1, 1, 1, 1, 2, 2, 2, 3]
+    >>> column_sums(['\\x0f', '\\xff', '\\x01'], use_numpy=True)
+    [1, 1, 1, 1, 2, 2, 2, 3]
+    >>> column_sums([])
+    []
+    >>> column_sums(['\\x0f', '\\xff', '\\x01'], use_numpy=False, weights=[1, 2, 3])
+    [2, 2, 2, 2, 3, 3, 3, 6]
+    >>> column_sums(['\\x0f', '\\xff', '\\x01'], use_numpy=True, weights=[1, 2, 3])
+    [2, 2, 2, 2, 3, 3, 3, 6]
+    """
+    if not digests:
+        return []
+    if use_numpy and numpy is not None:
+        return _column_sums_numpy(digests, weights=weights)
+    return _column_sums_python(digests, weights)
+
+
+def _column_sums_python(digests, weights=None):
+    """
+    Return a list of column sums for `digests` transposing a bitarray matrix.
+    """
+    arrays = (bitarray_from_bytes(d) for d in digests)
+    if weights is None:
+        transposed = izip(*arrays)
+        return list(imap(sum, transposed))
+
+    totals = [0] * (len(digests[0]) * 8)
+    for bits, weight in izip(arrays, weights):
+        totals = [t + weight * b for t, b in izip(totals, bits)]
+    return totals
+
+
+# number of digest rows unpacked at once as a bit matrix: this bounds the
+# memory used by the numpy column sums to about rows * bits bytes.
+NUMPY_CHUNK_ROWS = 2 ** 16
+
+
+def _column_sums_numpy(digests, chunk_rows=NUMPY_CHUNK_ROWS, weights=None):
+    """
+    Return a list of column sums for `digests` unpacking all digests as one
+    uint8 bit matrix (processed in chunks of `chunk_rows` rows) and summing
+    each column at once, or computing the product of the `weights` vector
+    and the matrix.
+    """
+    digest_size = len(digests[0])
+    totals = numpy.zeros(digest_size * 8, dtype=numpy.int64)
+    for start in range(0, len(digests), chunk_rows):
+        chunk = b''.join(digests[start:start + chunk_rows])
+        matrix = numpy.frombuffer(chunk, dtype=numpy.uint8)
+        matrix = matrix.reshape(-1, digest_size)
+        bits = numpy.unpackbits(matrix, axis=1)
+        if weights is None:
+            totals += bits.sum(axis=0, dtype=numpy.int64)
+        else:
+            rows = numpy.array(weights[start:start + chunk_rows], dtype=numpy.int64)
+            totals += rows.dot(bits.astype(numpy.int64))
+    return totals.tolist()
+
+
+def sum_buckets(digests, high, use_numpy=True):
+    """
+    Return a tuple of two lists (totals, counts) each with 2 ** `high` items
+    where `totals` is the sum of the integer values of the low bits and
+    `counts` the number of digests in each bucket for a `digests` list of byte
+    strings of the same length. The bucket of a digest is the integer value of
+    its `high` leftmost bits and the low bits are the remaining bits.
+
+    Use a vectorized numpy implementation if numpy is available and
+    `use_numpy` is True or a pure Python implementation otherwise. Both
+    return the same results.
+
+    For example:
+    >>> sum_buckets(['\\x0f', '\\xff', '\\x01', '\\xf1'], 2, use_numpy=False)
+    ([16, 0, 0, 112], [2, 0, 0, 2])
+    >>> sum_buckets(['\\x0f\\x00\\x00\\x00', '\\xff\\x00\\x00\\x00'], 2, use_numpy=True)
+    ([251658240, 0, 0, 1056964608], [1, 0, 0, 1])
+    """
+    buckets = 2 ** high
+    if not digests:
+        return [0] * buckets, [0] * buckets
+
+    if (use_numpy and numpy is not None
+        and len(digests[0]) % 4 == 0 and 0 < high < 32):
+        return _sum_buckets_numpy(digests, high)
+    return _sum_buckets_python(digests, high)
+
+
+def _sum_buckets_python(digests, high):
+    """
+    Return a tuple of (totals, counts) lists for `digests` using integers
+    shifts and masks.
+    """
+    buckets = 2 ** high
+    low = len(digests[0]) * 8 - high
+    lowmax = (1 << low) - 1
+    totals = [0] * buckets
+    counts = [0] * buckets
+    for digest in digests:
+        num = int(hexlify(digest), 16)
+        hi = num >> low
+        totals[hi] += num & lowmax
+        counts[hi] += 1
+    return totals, counts
+
+
+def _sum_buckets_numpy(digests, high, chunk_rows=NUMPY_CHUNK_ROWS):
+    """
+    Return a tuple of (totals, counts) lists for `digests` processing the
+    digests as rows of big-endian uint32 words. The low bits sums are
+    accumulated for each word column separately then recombined as integers.
+    """
+    buckets = 2 ** high
+    words = len(digests[0]) // 4
+    lowmask = numpy.uint32((1 << (32 - high)) - 1)
+    word_totals = [[0] * buckets for _ in range(words)]
+    counts = [0] * buckets
+
+    # the sums of a chunk of words must stay exact as float64 (2 ** 53)
+    chunk_rows = min(chunk_rows, 2 ** 20)
+    for start in range(0, len(digests), chunk_rows):
+        chunk = b''.join(digests[start:start + chunk_rows])
+        matrix = numpy.frombuffer(chunk, dtype='>u4').reshape(-1, words)
+        hi = (matrix[:, 0] >> numpy.uint32(32 - high)).astype(numpy.intp)
+        counts = [c + n for c, n in izip(counts,
+                  numpy.bincount(hi, minlength=buckets).tolist())]
+        for w in range(words):
+            column = matrix[:, w] & lowmask if w == 0 else matrix[:, w]
+            sums = numpy.bincount(hi, weights=column, minlength=buckets)
+            sums = sums.astype(numpy.int64).tolist()
+            word_totals[w] = [t + s for t, s in izip(word_totals[w], sums)]
+
+    totals = [0] * buckets
+    for w, sums in enumerate(word_totals):
+        shift = 32 * (words - w - 1)
+        totals = [t + (s << shift) for t, s in izip(totals, sums)]
+    return totals, counts
+
+
 def hamming_distance(bv1, bv2):
     """
     Return the Hamming distance between `bv1` and `bv2`  bitvectors as the
@@ -851,14 +1273,40 @@ def common_chunks(h1, h2, chunk_bytes_length=4):
     return sum(commons)
 
 
+def bytes_to_num(b):
+    """
+    Return an int (or long) for a big-endian byte string `b`.
+
+    For example:
+    >>> bytes_to_num('\\x01\\x00')
+    256
+    >>> bytes_to_num('')
+    0
+    """
+    return b and int(hexlify(b), 16) or 0
+
+
 def bit_to_num(bits):
     """
-    Return an int (or long) for a bit array.
-    
+    Return an int (or long) for a bit array. Long bit arrays are converted
+    from their packed bytes rather than from a string of 0 and 1.
+
     For example:
-    TODO: test
+    >>> bit_to_num(bitarray('1'))
+    1
+    >>> bit_to_num(bitarray('100000000'))
+    256
+    >>> bit_to_num(bitarray('1011', endian='little'))
+    11
+    >>> bit_to_num(bitarray())
+    0
     """
-    return int(bits.to01(), 2)
+    length = len(bits)
+    # parsing a short string of 0 and 1 is faster than hexlifying bytes
+    if length <= 128 or bits.endian() != 'big':
+        return int(bits.to01() or '0', 2)
+    # the last byte is padded with zero low bits
+    return int(hexlify(bits.tobytes()), 16) >> (-length % 8)
 
 
 # TODO: add test!
@@ -25,6 +25,9 @@
 from __future__ import absolute_import, division, print_function
 
 import hashlib
+from itertools import islice
+import mmap
+import os
 
 from commoncode.codec import bin_to_num
 from commoncode.codec import urlsafe_b64encode
@@ -46,10 +49,26 @@ def _hash_mod(bitsize, hmodule):
     Return a hashing class returning hashes with a `bitsize` bit length. The
     interface of this class is similar to the hash module API.
     """
+    digest_size = bitsize // 8
+
     class hasher(object):
+        # only keep the digest in each instance: one hasher is created for
+        # each hashed element and a per-instance __dict__ is costly
+        __slots__ = ('h',)
+
+        digest_size = bitsize // 8
+        # the underlying hashlib constructor
+        hashlib_module = hmodule
+
+        @staticmethod
+        def hash_many(msgs):
+            """
+            Return a list of digests for a `msgs` sequence of strings.
+            """
+            return [hmodule(m).digest()[:digest_size] for m in msgs]
+
         def __init__(self, msg=None):
-            self.digest_size = bitsize // 8
-            self.h = msg and hmodule(msg).digest()[:self.digest_size] or None
+            self.h = msg and hmodule(msg).digest()[:digest_size] or None
 
         def digest(self):
             return self.h
@@ -88,6 +107,80 @@ def get_hasher(bitsize):
     return _hashmodules_by_bitsize[bitsize]
 
 
+def hash_many(msgs, hasher):
+    """
+    Yield digests for a `msgs` iterable of strings using `hasher`, hashing
+    messages in batches.
+    """
+    msgs = iter(msgs)
+    while True:
+        batch = list(islice(msgs, 4096))
+        if not batch:
+            return
+        for digest in hasher.hash_many(batch):
+            yield digest
+
+
+# size of the buffers used to read files for checksums
+CHUNK_SIZE = 2 ** 20
+# files larger than this are memory-mapped rather than read for checksums
+MMAP_SIZE = 2 ** 26
+
+# checksum bitsize by name for multi_checksum
+checksum_bitsizes = {
+    'md5': 128,
+    'sha1': 160,
+    'sha256': 256,
+    'sha384': 384,
+    'sha512': 512,
+}
+
+
+def _checksums(location, bitsizes):
+    """
+    Return a mapping of {bitsize: digest} for each of the `bitsizes` computed
+    from the content of the file at `location`. The file is read only once,
+    by chunks or using a memory map for large files and each chunk is fed to
+    every hasher. The digest of an empty file is None.
+    """
+    hashers = {}
+    for bitsize in bitsizes:
+        hashers[bitsize] = get_hasher(bitsize).hashlib_module()
+    updaters = [h.update for h in hashers.values()]
+
+    size = os.path.getsize(location)
+    with open(location, 'rb') as f:
+        if size >= MMAP_SIZE:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for start in range(0, size, CHUNK_SIZE):
+                    chunk = buffer(mapped, start, CHUNK_SIZE)
+                    for update in updaters:
+                        update(chunk)
+            finally:
+                mapped.close()
+        else:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                for update in updaters:
+                    update(chunk)
+
+    if not size:
+        return dict((bitsize, None) for bitsize in hashers)
+    return dict((bitsize, h.digest()[:bitsize // 8])
+                for bitsize, h in hashers.items())
+
+
+def _encode(digest, base64=False):
+    if not digest:
+        return
+    if base64:
+        return urlsafe_b64encode(digest)
+    return digest.encode('hex')
+
+
 def checksum(location, bitsize, base64=False):
     """
     Return a checksum of `bitsize` length from the content of the file at
@@ -96,17 +189,24 @@ def checksum(location, bitsize, base64=False):
     """
     if not filetype.is_file(location):
         return
-    hasher = get_hasher(bitsize)
-
-    # fixme: we should read in chunks
-    with open(location, 'rb') as f:
-        hashable = f.read()
+    digest = _checksums(location, [bitsize])[bitsize]
+    return _encode(digest, base64)
 
-    hashed = hasher(hashable)
-    if base64:
-        return hashed.b64digest()
 
-    return hashed.hexdigest()
+def multi_checksum(location, algorithms=('md5', 'sha1', 'sha256', 'sha512'),
+                   base64=False):
+    """
+    Return a mapping of {algorithm name: checksum} for each of the
+    `algorithms` names (as found in `checksum_bitsizes`) computed from the
+    content of the file at `location` reading the file only once. The
+    checksums are hexdigests or base64-encoded is `base64` is True.
+    """
+    if not filetype.is_file(location):
+        return
+    bitsizes = [checksum_bitsizes[name] for name in algorithms]
+    digests = _checksums(location, bitsizes)
+    return dict((name, _encode(digests[checksum_bitsizes[name]], base64))
+                for name in algorithms)
 
 
 def md5(location):
@@ -0,0 +1,373 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from collections import defaultdict
+from itertools import combinations
+
+from samecode.halohash import as_bitarray
+from samecode.halohash import bit_to_num
+from samecode.halohash import hamming_distance
+
+
+"""
+Indexes of HaloHashes for fast near-duplicate lookups.
+
+A `HaloIndex` is a locality sensitive hashing (LSH) band index: each hash is
+split in a number of bands of contiguous bits and each band is used as a key
+in a band-specific hash table. Two hashes that are within a small Hamming
+distance are likely to share at least one identical band and are found as
+candidates with a few hash table lookups rather than by comparing a hash with
+every indexed hash. Candidates are then verified with an actual Hamming
+distance computation.
+
+By the pigeonhole principle, two hashes that differ by fewer bits than the
+number of bands always share at least one identical band: the index recall is
+exact for a `max_distance` below the number of bands. For larger distances
+the recall is probabilistic and can be estimated with `band_recall()`. More
+bands (and therefore fewer rows or bits per band) improve the recall but yield
+more candidates to verify, hence slower queries.
+
+A `MultiIndexHash` is a multi-index hashing (MIH) structure for exact queries
+of all the hashes within a Hamming distance `r`. Each hash is split in `m`
+contiguous substrings, each indexed in its own hash table. By the pigeonhole
+principle, two hashes within distance `r` have at least one substring within
+distance `r // m`: a query looks up every key within that smaller distance of
+each query substring and verifies the candidates. The results are the same as
+a brute force scan.
+"""
+
+
+class HaloIndex(object):
+    """
+    An LSH band index of HaloHashes of `size_in_bits` length split in `bands`
+    bands of equal bit length.
+
+    For example:
+    >>> from samecode.halohash import BitAverageHaloHash
+    >>> m1 = 'The value specified for size must be at least as large'.split()
+    >>> m2 = 'The value specific for size must be at least as large'.split()
+    >>> m3 = 'Some completely different text with some other words'.split()
+    >>> idx = HaloIndex(size_in_bits=128, bands=16)
+    >>> idx.add('m1', BitAverageHaloHash(m1, size_in_bits=128))
+    >>> idx.add('m3', BitAverageHaloHash(m3, size_in_bits=128))
+    >>> idx.query(BitAverageHaloHash(m2, size_in_bits=128), max_distance=20)
+    [('m1', 10)]
+    """
+
+    def __init__(self, size_in_bits=128, bands=16):
+        if size_in_bits % bands:
+            raise ValueError(
+                'Invalid number of bands: size_in_bits: %(size_in_bits)d '
+                'is not a multiple of bands: %(bands)d' % locals())
+        self.size_in_bits = size_in_bits
+        self.bands = bands
+        # number of bits per band
+        self.rows = size_in_bits // bands
+        # one table per band of {band key: [list of hash ids]}
+        self.tables = [defaultdict(list) for _ in range(bands)]
+        # {hash id: bitarray}
+        self.hashes = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, hid):
+        return hid in self.hashes
+
+    def band_keys(self, bits):
+        """
+        Return a list of band keys, one for each band of a `bits` bitarray.
+        """
+        if len(bits) != self.size_in_bits:
+            raise ValueError(
+                'Invalid hash length: %d. Expected: %d' % (
+                len(bits), self.size_in_bits))
+        rows = self.rows
+        if rows % 8 == 0:
+            # slice the bytes directly when bands are byte-aligned
+            digest = bits.tobytes()
+            size = rows // 8
+            return [digest[i:i + size] for i in range(0, len(digest), size)]
+        return [bits[i:i + rows].to01() for i in range(0, self.size_in_bits, rows)]
+
+    def add(self, hid, halo):
+        """
+        Add a `halo` hash with a `hid` hash id to the index. `halo` is either a
+        HaloHash instance, a bitarray or a binary digest string. Adding a hash
+        with an existing `hid` replaces the previous hash.
+        """
+        if hid in self.hashes:
+            self.remove(hid)
+        bits = as_bitarray(halo)
+        for table, key in zip(self.tables, self.band_keys(bits)):
+            table[key].append(hid)
+        self.hashes[hid] = bits
+
+    def remove(self, hid):
+        """
+        Remove the hash with `hid` hash id from the index.
+        """
+        bits = self.hashes.pop(hid)
+        for table, key in zip(self.tables, self.band_keys(bits)):
+            hids = table[key]
+            hids.remove(hid)
+            if not hids:
+                del table[key]
+
+    def candidates(self, halo):
+        """
+        Return a set of candidate hash ids that share at least one identical
+        band with a `halo` hash.
+        """
+        bits = as_bitarray(halo)
+        found = set()
+        for table, key in zip(self.tables, self.band_keys(bits)):
+            hids = table.get(key)
+            if hids:
+                found.update(hids)
+        return found
+
+    def query(self, halo, max_distance):
+        """
+        Return a list of (hash id, distance) tuples for indexed hashes that are
+        within `max_distance` Hamming distance of a `halo` hash, sorted by
+        distance then hash id.
+        """
+        bits = as_bitarray(halo)
+        hashes = self.hashes
+        matches = []
+        for hid in self.candidates(bits):
+            distance = hamming_distance(bits, hashes[hid])
+            if distance <= max_distance:
+                matches.append((hid, distance))
+        return sorted(matches, key=lambda m: (m[1], m[0]))
+
+    def recall(self, max_distance):
+        """
+        Return the estimated recall of this index for a `max_distance`.
+        """
+        return band_recall(self.size_in_bits, self.bands, max_distance)
+
+
+class MultiIndexHash(object):
+    """
+    A multi-index hashing structure of HaloHashes of `size_in_bits` length
+    split in `substrings` contiguous substrings of equal bit length, for exact
+    Hamming distance queries.
+
+    For example:
+    >>> from samecode.halohash import BitQuartileHaloHash
+    >>> m1 = 'The value specified for size must be at least as large'.split()
+    >>> m2 = 'The value specific for size must be at least as large'.split()
+    >>> m3 = 'Some completely different text with some other words'.split()
+    >>> mih = MultiIndexHash(size_in_bits=128, substrings=8)
+    >>> mih.add('m1', BitQuartileHaloHash(m1, size_in_bits=128))
+    >>> mih.add('m3', BitQuartileHaloHash(m3, size_in_bits=128))
+    >>> mih.query(BitQuartileHaloHash(m2, size_in_bits=128), max_distance=20)
+    [('m1', 18)]
+    """
+
+    def __init__(self, size_in_bits=128, substrings=8):
+        if size_in_bits % substrings:
+            raise ValueError(
+                'Invalid number of substrings: size_in_bits: %(size_in_bits)d '
+                'is not a multiple of substrings: %(substrings)d' % locals())
+        self.size_in_bits = size_in_bits
+        self.substrings = substrings
+        # number of bits per substring
+        self.substring_bits = size_in_bits // substrings
+        self.mask = (1 << self.substring_bits) - 1
+        # one table per substring of {substring int value: set of hash ids}
+        self.tables = [defaultdict(set) for _ in range(substrings)]
+        # {hash id: bitarray}
+        self.hashes = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, hid):
+        return hid in self.hashes
+
+    def keys(self, bits):
+        """
+        Return a list of integer keys, one for each contiguous substring of a
+        `bits` bitarray.
+        """
+        if len(bits) != self.size_in_bits:
+            raise ValueError(
+                'Invalid hash length: %d. Expected: %d' % (
+                len(bits), self.size_in_bits))
+        num = bit_to_num(bits)
+        size = self.substring_bits
+        mask = self.mask
+        return [(num >> (self.size_in_bits - (i + 1) * size)) & mask
+                for i in range(self.substrings)]
+
+    def add(self, hid, halo):
+        """
+        Add a `halo` hash with a `hid` hash id to the index. `halo` is either a
+        HaloHash instance, a bitarray or a binary digest string. Adding a hash
+        with an existing `hid` replaces the previous hash.
+        """
+        if hid in self.hashes:
+            self.remove(hid)
+        bits = as_bitarray(halo)
+        for table, key in zip(self.tables, self.keys(bits)):
+            table[key].add(hid)
+        self.hashes[hid] = bits
+
+    def remove(self, hid):
+        """
+        Remove the hash with `hid` hash id from the index.
+        """
+        bits = self.hashes.pop(hid)
+        for table, key in zip(self.tables, self.keys(bits)):
+            hids = table[key]
+            hids.discard(hid)
+            if not hids:
+                del table[key]
+
+    def neighbor_keys(self, key, radius):
+        """
+        Yield all the keys within `radius` Hamming distance of a substring
+        `key`.
+        """
+        positions = range(self.substring_bits)
+        for flips in range(radius + 1):
+            for flipped in combinations(positions, flips):
+                mask = 0
+                for pos in flipped:
+                    mask |= 1 << pos
+                yield key ^ mask
+
+    def candidates(self, halo, max_distance):
+        """
+        Return a set of candidate hash ids that have at least one substring
+        within `max_distance // substrings` of the corresponding substring of a
+        `halo` hash. This is a superset of the hashes within `max_distance`.
+        """
+        bits = as_bitarray(halo)
+        radius = max_distance // self.substrings
+        # number of keys to look up in each table for this radius
+        lookups = sum(_comb(self.substring_bits, i) for i in range(radius + 1))
+
+        found = set()
+        for table, key in zip(self.tables, self.keys(bits)):
+            if lookups > len(table):
+                # scanning the table is cheaper than enumerating the keys
+                for indexed, hids in table.iteritems():
+                    if bin(indexed ^ key).count('1') <= radius:
+                        found.update(hids)
+            else:
+                for neighbor in self.neighbor_keys(key, radius):
+                    hids = table.get(neighbor)
+                    if hids:
+                        found.update(hids)
+        return found
+
+    def query(self, halo, max_distance):
+        """
+        Return a list of (hash id, distance) tuples for all indexed hashes that
+        are within `max_distance` Hamming distance of a `halo` hash, sorted by
+        distance then hash id.
+        """
+        bits = as_bitarray(halo)
+        hashes = self.hashes
+        matches = []
+        for hid in self.candidates(bits, max_distance):
+            distance = hamming_distance(bits, hashes[hid])
+            if distance <= max_distance:
+                matches.append((hid, distance))
+        return sorted(matches, key=lambda m: (m[1], m[0]))
+
+
+def _comb(n, k):
+    """
+    Return the number of combinations of `k` elements among `n`.
+    """
+    if k < 0 or k > n:
+        return 0
+    k = min(k, n - k)
+    result = 1
+    for i in range(1, k + 1):
+        result = result * (n - k + i) // i
+    return result
+
+
+def band_recall(size_in_bits, bands, distance):
+    """
+    Return the probability that two hashes of `size_in_bits` that differ by
+    exactly `distance` bits share at least one identical band when split in
+    `bands` bands, assuming the different bits are uniformly distributed.
+
+    For example:
+    >>> band_recall(128, 16, 15)
+    1.0
+    >>> round(band_recall(128, 16, 16), 6)
+    0.999997
+    >>> round(band_recall(128, 8, 20), 3)
+    0.387
+    """
+    if distance < bands:
+        # pigeonhole: at least one band is unchanged
+        return 1.0
+    rows = size_in_bits // bands
+    total = _comb(size_in_bits, distance)
+    # inclusion-exclusion on the number of bands left unchanged
+    unchanged = 0
+    for k in range(1, bands + 1):
+        sign = 1 if k % 2 else -1
+        unchanged += sign * _comb(bands, k) * _comb(size_in_bits - k * rows, distance)
+    return unchanged / total
+
+
+def band_layouts(size_in_bits, max_distance):
+    """
+    Return a list of (bands, rows, recall, collision rate) tuples for each
+    possible band layout of `size_in_bits` hashes, where `recall` is the
+    estimated recall for `max_distance` and the collision rate is the
+    estimated fraction of unrelated random hashes returned as candidates by a
+    query. This collision rate drives the query latency.
+
+    For example:
+    >>> for layout in band_layouts(32, 3):
+    ...    print('%d %d %.3f %.6f' % layout)
+    1 32 0.000 0.000000
+    2 16 0.226 0.000031
+    4 8 1.000 0.015534
+    8 4 1.000 0.403281
+    16 2 1.000 0.989977
+    32 1 1.000 1.000000
+    """
+    layouts = []
+    for bands in range(1, size_in_bits + 1):
+        if size_in_bits % bands:
+            continue
+        rows = size_in_bits // bands
+        recall = band_recall(size_in_bits, bands, max_distance)
+        collisions = 1 - (1 - 2 ** -rows) ** bands
+        layouts.append((bands, rows, recall, collisions))
+    return layouts
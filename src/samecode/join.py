@@ -0,0 +1,330 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from itertools import izip
+from multiprocessing import Pool
+import os
+import struct
+
+from commoncode import fileutils
+
+from samecode.halohash import as_digest
+from samecode.halohash import bytes_to_num
+
+
+"""
+Find all the pairs of near-duplicate HaloHashes of a corpus within a maximum
+Hamming distance (a.k.a. a similarity self-join).
+
+The join uses pigeonhole partitioning: each hash is split in `max_distance`
++ 1 segments of contiguous bits and two hashes within `max_distance` must
+have at least one identical segment. Each (segment, segment value) pair is a
+join key: hashes are distributed to a fixed number of partitions by join key
+and only the hashes that share a join key are compared, rather than all the
+pairs of hashes.
+
+Partitions are buffered in memory and spilled to temporary files when the
+buffers exceed a memory budget. A partition is loaded whole in memory to be
+joined: partitions too large to be joined within the memory budget are split
+again in sub-partitions by join key before joining. Partitions are then
+joined independently in a pool of processes. A pair sharing several join
+keys is reported only once, for the first segment they have in common.
+Verified pairs are yielded as a stream.
+
+The memory used is bounded by the memory budget, except for the ids of the
+hashes, the verified pairs of a partition and the hashes sharing a single join
+key, which cannot be split.
+"""
+
+# default number of bytes of partitioned hashes buffered in memory
+MEMORY_BUDGET = 2 ** 28
+
+# default number of partitions
+PARTITIONS = 64
+
+# approximate ratio of the memory used to join a partition to the size of
+# its entries
+JOIN_MEMORY_RATIO = 16
+
+# maximum number of times a partition too large to be joined is split again
+MAX_SPLITS = 4
+
+# segment index and hash index stored before each digest in a partition
+ENTRY = struct.Struct('<HI')
+
+
+def segments(size_in_bits, max_distance):
+    """
+    Return a list of (shift, mask) tuples to extract each of the
+    `max_distance` + 1 segments of a hash of `size_in_bits` converted to an
+    integer, as (num >> shift) & mask. Segments are as even as possible.
+
+    For example:
+    >>> segments(8, 2)
+    [(5, 7), (2, 7), (0, 3)]
+    """
+    count = max_distance + 1
+    if count > size_in_bits:
+        raise ValueError(
+            'max_distance: %(max_distance)d must be smaller than the hash '
+            'size: %(size_in_bits)d' % locals())
+    base, extra = divmod(size_in_bits, count)
+    layout = []
+    end = size_in_bits
+    for i in range(count):
+        bits = base + (1 if i < extra else 0)
+        end -= bits
+        layout.append((end, (1 << bits) - 1))
+    return layout
+
+
+def _keys(num, layout):
+    return [(num >> shift) & mask for shift, mask in layout]
+
+
+def _join_key(data, start, digest_size, layout):
+    """
+    Return a (segment, segment value) join key for the entry at `start` in
+    `data`.
+    """
+    segment, _index = ENTRY.unpack_from(data, start)
+    num = bytes_to_num(data[start + ENTRY.size:start + ENTRY.size + digest_size])
+    shift, mask = layout[segment]
+    return segment, (num >> shift) & mask
+
+
+def _join_partition(args):
+    """
+    Return a sorted list of (index1, index2, distance) for the verified pairs
+    of a partition. The partition is either the bytes of its entries or the
+    location of a file with these entries.
+    """
+    data, location, digest_size, layout, max_distance = args
+    if location:
+        with open(location, 'rb') as f:
+            data = f.read()
+
+    entry_size = ENTRY.size + digest_size
+    groups = {}
+    for start in xrange(0, len(data), entry_size):
+        segment, index = ENTRY.unpack_from(data, start)
+        num = bytes_to_num(data[start + ENTRY.size:start + entry_size])
+        shift, mask = layout[segment]
+        key = segment, (num >> shift) & mask
+        groups.setdefault(key, []).append((index, num))
+
+    pairs = []
+    for (segment, _value), members in groups.iteritems():
+        if len(members) < 2:
+            continue
+        members.sort()
+        for i, (index1, num1) in enumerate(members):
+            for index2, num2 in members[i + 1:]:
+                distance = bin(num1 ^ num2).count('1')
+                if distance > max_distance:
+                    continue
+                # only report a pair for the first segment they have in common
+                keys1 = _keys(num1, layout[:segment])
+                if any(k1 == k2 for k1, k2 in izip(keys1, _keys(num2, layout[:segment]))):
+                    continue
+                pairs.append((index1, index2, distance))
+    pairs.sort()
+    return pairs
+
+
+class _Partitions(object):
+    """
+    Buffers of partitioned entries spilled to files in a temporary directory
+    when larger than `memory_budget` bytes. `name` is a prefix for the names
+    of these files.
+    """
+
+    def __init__(self, count, memory_budget, temp_dir=None, name='partition'):
+        self.buffers = [[] for _ in range(count)]
+        self.buffered = 0
+        self.memory_budget = memory_budget
+        self.temp_dir = temp_dir
+        self.name = name
+        self.locations = [None] * count
+
+    def add(self, partition, entry):
+        self.buffers[partition].append(entry)
+        self.buffered += len(entry)
+        if self.buffered > self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        if self.temp_dir is None:
+            self.temp_dir = fileutils.get_temp_dir(base_dir='samecode', prefix='join-')
+        for partition, buf in enumerate(self.buffers):
+            if not buf:
+                continue
+            location = self.locations[partition]
+            if location is None:
+                location = os.path.join(
+                    self.temp_dir, '%s-%d' % (self.name, partition))
+                self.locations[partition] = location
+            with open(location, 'ab') as f:
+                f.write(b''.join(buf))
+            self.buffers[partition] = []
+        self.buffered = 0
+
+    def tasks(self, digest_size, layout, splits=0):
+        """
+        Yield tuples of (data, location) for each non-empty partition. The
+        partitions that would use more than the memory budget to be joined
+        are split in sub-partitions, at most MAX_SPLITS times.
+        """
+        max_size = max(self.memory_budget // JOIN_MEMORY_RATIO, 1)
+        if any(self.locations):
+            # free the buffers of partitions that were spilled
+            self.spill()
+
+        for partition, buf in enumerate(self.buffers):
+            location = self.locations[partition]
+            if location:
+                size = os.path.getsize(location)
+            else:
+                size = sum(len(entry) for entry in buf)
+            if not size:
+                continue
+
+            if size <= max_size or splits >= MAX_SPLITS:
+                if location:
+                    yield None, location
+                else:
+                    yield b''.join(buf), None
+                continue
+
+            if location:
+                blocks = _read_blocks(location, ENTRY.size + digest_size,
+                                      max_size)
+            else:
+                blocks = buf
+                self.buffers[partition] = []
+            subparts = self.split(partition, blocks, size // max_size * 2,
+                                  digest_size, layout, splits + 1)
+            if location:
+                os.remove(location)
+            for task in subparts.tasks(digest_size, layout, splits + 1):
+                yield task
+
+    def split(self, partition, blocks, count, digest_size, layout, splits):
+        """
+        Return new _Partitions with the entries of `partition` from an
+        iterable of `blocks` of entries, split by join key in `count`
+        sub-partitions.
+        """
+        if self.temp_dir is None:
+            self.temp_dir = fileutils.get_temp_dir(base_dir='samecode', prefix='join-')
+        count = min(max(count, 2), PARTITIONS)
+        subparts = _Partitions(count, self.memory_budget, self.temp_dir,
+                               '%s-%d' % (self.name, partition))
+        entry_size = ENTRY.size + digest_size
+        for block in blocks:
+            for start in xrange(0, len(block), entry_size):
+                segment, value = _join_key(block, start, digest_size, layout)
+                # the low bits of the hashes of tuples of integers are
+                # correlated from one split to the next: hash a string
+                key = '%d:%d:%d' % (splits, segment, value)
+                subparts.add(hash(key) % count, block[start:start + entry_size])
+        return subparts
+
+
+def _read_blocks(location, entry_size, block_size):
+    """
+    Yield blocks of whole entries of `entry_size` bytes from the file at
+    `location`, each of about `block_size` bytes.
+    """
+    block_size = max(block_size // entry_size, 1) * entry_size
+    with open(location, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+def self_join(items, max_distance, processes=None, partitions=PARTITIONS,
+              memory_budget=MEMORY_BUDGET):
+    """
+    Yield (id1, id2, distance) tuples for each pair of hashes from an `items`
+    iterable of (id, hash) tuples that are within `max_distance` of each
+    other, where id1 is the id of the first of the two hashes in `items`. Each
+    hash is either a HaloHash instance, a bitarray or a binary digest string
+    and all hashes must have the same size.
+
+    Partitions are joined in a pool of `processes` processes if `processes`
+    is more than one. Partitioned hashes are spilled to temporary files when
+    they use more than `memory_budget` bytes. Pairs are yielded in a
+    deterministic order for a given number of `partitions`.
+
+    For example:
+    >>> items = [('a', '\\x00\\x00'), ('b', '\\x00\\x03'), ('c', '\\xff\\xff'),
+    ...          ('d', '\\x80\\x00')]
+    >>> sorted(self_join(items, max_distance=2))
+    [('a', 'b', 2), ('a', 'd', 1)]
+    """
+    ids = []
+    digest_size = None
+    layout = None
+    parts = _Partitions(partitions, memory_budget)
+    try:
+        for index, (hid, halo) in enumerate(items):
+            digest = as_digest(halo)
+            if digest_size is None:
+                digest_size = len(digest)
+                layout = segments(digest_size * 8, max_distance)
+            elif len(digest) != digest_size:
+                raise ValueError('All hashes must have the same length.')
+            ids.append(hid)
+            num = bytes_to_num(digest)
+            for segment, key in enumerate(_keys(num, layout)):
+                partition = hash((segment, key)) % partitions
+                parts.add(partition, ENTRY.pack(segment, index) + digest)
+
+        tasks = [(data, location, digest_size, layout, max_distance)
+                 for data, location in parts.tasks(digest_size, layout)]
+        parts.buffers = None
+
+        if processes and processes > 1:
+            pool = Pool(processes)
+            try:
+                results = pool.imap(_join_partition, tasks)
+                for pairs in results:
+                    for index1, index2, distance in pairs:
+                        yield ids[index1], ids[index2], distance
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for task in tasks:
+                for index1, index2, distance in _join_partition(task):
+                    yield ids[index1], ids[index2], distance
+    finally:
+        if parts.temp_dir:
+            fileutils.delete(parts.temp_dir)
@@ -0,0 +1,304 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+import mmap
+import os
+import struct
+
+from bitarray import bitdiff
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from samecode.halohash import as_digest
+from samecode.halohash import bitarray_from_bytes
+
+
+"""
+A compact on-disk store of fixed-width HaloHash digests.
+
+A store is made of three files:
+
+- a data file with a small fixed header followed by all the digests stored
+  contiguously as raw bytes. This file is memory-mapped when opened and the
+  digests are accessed in place without decoding or copying them.
+
+- a sidecar ids file with the id of each digest, one per line and in the same
+  order as the digests.
+
+- a sidecar offsets file with a fixed-width table of the offsets of each id
+  in the ids file, followed by the size of the ids file. This file and the
+  ids file are also memory-mapped: the id of a digest is looked up by its
+  position only when needed, such as for the hits of a query.
+
+Threshold queries XOR a query digest with all the stored digests at once and
+count the bits set using numpy if available or a slower pure Python scan
+otherwise.
+"""
+
+MAGIC = b'HALOSTOR'
+VERSION = 2
+# magic, format version, digest size in bytes
+HEADER = struct.Struct('<8sII')
+# offset of an id in the ids file
+OFFSET = struct.Struct('<Q')
+
+
+def ids_location(location):
+    """
+    Return the location of the ids sidecar file for a store data file at
+    `location`.
+    """
+    return location + '.ids'
+
+
+def offsets_location(location):
+    """
+    Return the location of the id offsets sidecar file for a store data file
+    at `location`.
+    """
+    return location + '.offsets'
+
+
+class FingerprintStoreWriter(object):
+    """
+    Write a fingerprint store at `location` for digests of `digest_size` bytes.
+    Use as a context manager or call close() when done.
+    """
+
+    def __init__(self, location, digest_size):
+        self.location = location
+        self.digest_size = digest_size
+        self.count = 0
+        self._data = open(location, 'wb')
+        self._ids = open(ids_location(location), 'wb')
+        self._offsets = open(offsets_location(location), 'wb')
+        self._ids_size = 0
+        self._data.write(HEADER.pack(MAGIC, VERSION, digest_size))
+        self._offsets.write(OFFSET.pack(0))
+
+    def add(self, fid, halo):
+        """
+        Add a `halo` hash with the `fid` id. `halo` is either a HaloHash
+        instance, a bitarray or a binary digest string. `fid` is stored as a
+        string and cannot contain line breaks.
+        """
+        digest = as_digest(halo)
+        if len(digest) != self.digest_size:
+            raise ValueError(
+                'Invalid digest size: %d. Expected: %d' % (
+                len(digest), self.digest_size))
+        fid = fid.encode('utf-8') if isinstance(fid, unicode) else str(fid)
+        if b'\n' in fid or b'\r' in fid:
+            raise ValueError('Invalid id with a line break: %(fid)r' % locals())
+        self._data.write(digest)
+        self._ids.write(fid + b'\n')
+        self._ids_size += len(fid) + 1
+        self._offsets.write(OFFSET.pack(self._ids_size))
+        self.count += 1
+
+    def close(self):
+        self._data.close()
+        self._ids.close()
+        self._offsets.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_store(location, items, digest_size):
+    """
+    Write a fingerprint store at `location` for an `items` iterable of (id,
+    hash) tuples with digests of `digest_size` bytes. Return the number of
+    items written.
+    """
+    with FingerprintStoreWriter(location, digest_size) as writer:
+        for fid, halo in items:
+            writer.add(fid, halo)
+    return writer.count
+
+
+class FingerprintStore(object):
+    """
+    A read-only memory-mapped fingerprint store at `location`. Use as a
+    context manager or call close() when done.
+    """
+
+    # number of digests scanned at once by a query: this bounds the memory
+    # used by a query to about 2 * chunk_rows * digest_size bytes
+    chunk_rows = 2 ** 20
+
+    def __init__(self, location):
+        self.location = location
+        self._file = open(location, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError('Invalid fingerprint store: %(location)r' % locals())
+
+        magic, version, digest_size = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Invalid or unsupported fingerprint store: '
+                             '%(location)r' % locals())
+        self.digest_size = digest_size
+        self.count = (size - HEADER.size) // digest_size
+
+        self._map = None
+        self._ids_file = open(ids_location(location), 'rb')
+        self._ids_map = None
+        self._offsets_file = open(offsets_location(location), 'rb')
+        self._offsets_map = None
+
+        offsets_size = os.fstat(self._offsets_file.fileno()).st_size
+        if offsets_size != (self.count + 1) * OFFSET.size:
+            self.close()
+            raise ValueError('Invalid fingerprint store ids offsets: '
+                             '%(location)r' % locals())
+
+        if self.count:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._offsets_map = mmap.mmap(
+                self._offsets_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._ids_map = mmap.mmap(
+                self._ids_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for mapped in (self._map, self._ids_map, self._offsets_map):
+            if mapped is not None:
+                mapped.close()
+        self._map = self._ids_map = self._offsets_map = None
+        self._file.close()
+        self._ids_file.close()
+        self._offsets_file.close()
+
+    def fid(self, index):
+        """
+        Return the id of the digest at `index` position.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        start, = OFFSET.unpack_from(self._offsets_map, index * OFFSET.size)
+        end, = OFFSET.unpack_from(self._offsets_map, (index + 1) * OFFSET.size)
+        # ids end with a line break
+        return self._ids_map[start:end - 1]
+
+    def digest(self, index):
+        """
+        Return the digest at `index` position.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        start = HEADER.size + index * self.digest_size
+        return self._map[start:start + self.digest_size]
+
+    def __iter__(self):
+        """
+        Yield (id, digest) tuples for all the digests in the store.
+        """
+        for index in xrange(self.count):
+            yield self.fid(index), self.digest(index)
+
+    def matrix(self):
+        """
+        Return a numpy uint8 array of (count, digest_size) shape backed by the
+        memory-mapped store without copying data.
+        """
+        if not self.count:
+            return numpy.zeros((0, self.digest_size), dtype=numpy.uint8)
+        return numpy.frombuffer(self._map, dtype=numpy.uint8,
+            count=self.count * self.digest_size, offset=HEADER.size,
+            ).reshape(self.count, self.digest_size)
+
+    def distances(self, halo, max_distance=None):
+        """
+        Return an iterable of (index, distance) tuples for the Hamming
+        distance between a `halo` hash and each digest of the store. Only
+        return digests within `max_distance` if provided.
+        """
+        digest = as_digest(halo)
+        if len(digest) != self.digest_size:
+            raise ValueError(
+                'Invalid digest size: %d. Expected: %d' % (
+                len(digest), self.digest_size))
+        if max_distance is None:
+            max_distance = self.digest_size * 8
+        if numpy is None:
+            return self._distances_python(digest, max_distance)
+        return self._distances_numpy(digest, max_distance)
+
+    def _distances_python(self, digest, max_distance):
+        bits = bitarray_from_bytes(digest)
+        for index in range(self.count):
+            distance = bitdiff(bits, bitarray_from_bytes(self.digest(index)))
+            if distance <= max_distance:
+                yield index, distance
+
+    def _distances_numpy(self, digest, max_distance):
+        query = numpy.frombuffer(digest, dtype=numpy.uint8)
+        matrix = self.matrix()
+        for start in range(0, self.count, self.chunk_rows):
+            chunk = matrix[start:start + self.chunk_rows]
+            distances = bit_counts(numpy.bitwise_xor(chunk, query))
+            hits = numpy.flatnonzero(distances <= max_distance)
+            for offset, distance in zip(hits.tolist(), distances[hits].tolist()):
+                yield start + offset, distance
+
+    def query(self, halo, max_distance):
+        """
+        Return a list of (id, distance) tuples for the digests that are within
+        `max_distance` Hamming distance of a `halo` hash, sorted by distance
+        then position in the store.
+        """
+        matches = sorted((distance, index)
+            for index, distance in self.distances(halo, max_distance))
+        return [(self.fid(index), distance) for distance, index in matches]
+
+
+if numpy is not None:
+    # number of bits set for each possible byte value
+    POPCOUNTS = numpy.array([bin(i).count('1') for i in range(256)],
+                            dtype=numpy.uint8)
+
+
+def bit_counts(matrix):
+    """
+    Return a numpy array with the number of bits set in each row of a `matrix`
+    numpy uint8 array.
+    """
+    return POPCOUNTS[matrix].sum(axis=1, dtype=numpy.int64)
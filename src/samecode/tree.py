@@ -0,0 +1,181 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, division, print_function
+
+from collections import deque
+from collections import namedtuple
+from multiprocessing import Pool
+import os
+
+from samecode import hash as commoncode_hash
+from samecode.fingerprint import fingerprint_file
+from samecode.fingerprint import LINES
+
+
+"""
+Compute checksums and HaloHash fingerprints for all the files of a directory
+tree.
+
+Files are dispatched to a pool of processes in batches of files balanced by
+size such that each batch has roughly the same amount of bytes to read. At
+most a bounded number of batches are in flight at any time and records are
+returned in the walk order of the tree, whatever the number of processes.
+"""
+
+# maximum number of bytes and of files in a batch
+BATCH_BYTES = 2 ** 24
+BATCH_FILES = 256
+
+# default checksums computed for each file
+ALGORITHMS = ('md5', 'sha1')
+
+
+Record = namedtuple('Record', 'path checksums halohash error')
+
+
+def file_size(location):
+    """
+    Return the size of the file at `location` or 0 if its size cannot be
+    read, for instance if the file was deleted.
+    """
+    try:
+        return os.path.getsize(location)
+    except OSError:
+        return 0
+
+
+def walk_files(root):
+    """
+    Yield tuples of (path, size) for all the files in the `root` directory
+    tree (or for `root` if this is a file) in a sorted, deterministic order.
+    Symlinks are not followed. The size of a file that cannot be read is 0.
+    """
+    if os.path.isfile(root):
+        yield root, file_size(root)
+        return
+
+    for top, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(top, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield path, file_size(path)
+
+
+def batches(files, batch_bytes=BATCH_BYTES, batch_files=BATCH_FILES):
+    """
+    Yield lists of paths from an iterable of `files` (path, size) tuples. Each
+    list has at most `batch_files` paths and at most `batch_bytes` total size,
+    unless it contains a single larger file.
+    """
+    batch = []
+    total = 0
+    for path, size in files:
+        if batch and (total + size > batch_bytes or len(batch) >= batch_files):
+            yield batch
+            batch = []
+            total = 0
+        batch.append(path)
+        total += size
+    if batch:
+        yield batch
+
+
+def file_halohash(location, kind=LINES, ngram=1, size_in_bits=128):
+    """
+    Return a binary HaloHash digest of `size_in_bits` for the file at
+    `location` or None if the file has no tokens. See
+    samecode.fingerprint.tokens() for `kind` and `ngram`.
+    """
+    halo = fingerprint_file(location, kind, ngram, size_in_bits)
+    if not halo.elements_count():
+        return None
+    return halo.digest()
+
+
+def fingerprint_record(location, algorithms=ALGORITHMS, kind=LINES, ngram=1,
+                       size_in_bits=128):
+    """
+    Return a Record for the file at `location`. If the file cannot be read,
+    for instance if it was deleted or is not readable, return a Record
+    without checksums and halohash and with an error message.
+    """
+    try:
+        checksums = commoncode_hash.multi_checksum(location, algorithms)
+        halo = file_halohash(location, kind, ngram, size_in_bits)
+    except (IOError, OSError) as e:
+        return Record(location, None, None, str(e))
+    return Record(location, checksums, halo, None)
+
+
+def _fingerprint_batch(args):
+    paths, options = args
+    return [fingerprint_record(path, **options) for path in paths]
+
+
+def fingerprint_tree(root, workers=None, algorithms=ALGORITHMS, kind=LINES,
+                     ngram=1, size_in_bits=128, batch_bytes=BATCH_BYTES,
+                     batch_files=BATCH_FILES, max_pending=None):
+    """
+    Yield a Record of (path, checksums, halohash, error) for each file of the
+    `root` directory tree, where checksums is a mapping of {algorithm: hex
+    checksum} for the `algorithms` checksums and halohash is a binary
+    HaloHash digest of `size_in_bits` or None. See
+    samecode.fingerprint.tokens() for `kind` and `ngram`. If a file cannot be
+    read, checksums and halohash are None and error is an error message;
+    otherwise error is None.
+
+    Records are yielded in the sorted walk order of the tree. When `workers`
+    is more than one, files are processed in a pool of `workers` processes
+    with at most `max_pending` batches queued at once (twice the number of
+    workers by default) such that memory stays bounded for very large trees.
+    """
+    options = dict(algorithms=algorithms, kind=kind, ngram=ngram,
+                   size_in_bits=size_in_bits)
+    tasks = ((batch, options) for batch in
+             batches(walk_files(root), batch_bytes, batch_files))
+
+    if not workers or workers <= 1:
+        for task in tasks:
+            for record in _fingerprint_batch(task):
+                yield record
+        return
+
+    max_pending = max_pending or workers * 2
+    pool = Pool(workers)
+    try:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_fingerprint_batch, (task,)))
+            if len(pending) >= max_pending:
+                for record in pending.popleft().get():
+                    yield record
+        while pending:
+            for record in pending.popleft().get():
+                yield record
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -24,36 +24,171 @@
 
 from __future__ import absolute_import, print_function
 
+from collections import namedtuple
+from collections import OrderedDict
+from multiprocessing import Pool
+import os
+import re
 
 import typecode
-from commoncode.filetype import counter
-from commoncode.functional import memoize
 from commoncode import filetype
 
 
-@memoize
+class LRUCache(object):
+    """
+    A cache of the values computed for files, bounded to `max_entries`
+    entries, evicting the least recently used entries first. A cached value
+    is valid only as long as the size and modification time of its file are
+    unchanged.
+
+    For example:
+    >>> cache = LRUCache(max_entries=2)
+    >>> cache.get(__file__, lambda loc: 1)
+    1
+    >>> cache.get(__file__, lambda loc: 2)
+    1
+    >>> cache.stats() == dict(entries=1, max_entries=2, hits=1, misses=1, evictions=0)
+    True
+    >>> cache.clear()
+    >>> cache.get(__file__, lambda loc: 2)
+    2
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        # {location: ((size, mtime), value)} in least to most recently used
+        # order
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, location, compute):
+        """
+        Return the cached value for the file at `location` or compute it by
+        calling `compute(location)` and cache it.
+        """
+        try:
+            st = os.stat(location)
+        except OSError:
+            return compute(location)
+        key = st.st_size, st.st_mtime
+
+        entries = self.entries
+        cached = entries.pop(location, None)
+        if cached is not None and cached[0] == key:
+            self.hits += 1
+            entries[location] = cached
+            return cached[1]
+
+        self.misses += 1
+        value = compute(location)
+        entries[location] = key, value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def stats(self):
+        """
+        Return a mapping of cache statistics.
+        """
+        return dict(
+            entries=len(self.entries),
+            max_entries=self.max_entries,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def clear(self):
+        """
+        Remove all the cached entries and reset the statistics.
+        """
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+# cache of (code, comment) line counts by file
+lines_count_cache = LRUCache()
+
+
 def file_lines_count(location):
     """
     Return a tuple of (code, comment) line counts in a source text file at
-    `location`. Memoization guarantees that we do only one pass on a file.
+    `location`. Caching guarantees that we do only one pass on an unchanged
+    file.
     """
+    return lines_count_cache.get(location, _file_lines_count)
 
-    code = 0
-    comment = 0
 
+# size of the blocks of bytes read at once when counting lines
+BLOCK_SIZE = 2 ** 20
+
+# a blank line with only whitespace, after its preceding line end
+blank_lines = re.compile(br'\n[ \t\r\x0b\x0c]*(?=\n)').findall
+
+# a line starting with a comment prefix, after its preceding line end
+# TODO implement a better comment function
+comment_lines = re.compile(br'\n[ \t\r\x0b\x0c]*(?:[/#;*]|@rem)').findall
+
+COMMENT_PREFIXES = ('/', '#', '@rem', ';', '*',)
+
+
+def _file_lines_count(location):
+    """
+    Return a tuple of (code, comment) line counts in a source text file at
+    `location`.
+    """
     T = typecode.contenttype.get_type(location)
     if not T.is_source:
-        return code, comment
-
-    with open(location, 'rb') as lines:
-        for line in lines:
-            ls = line.strip()
-            if ls:
-                # TODO implement a better comment function
-                if ls.startswith(('/', '#', '@rem', ';', '*',)):
-                    comment += 1
-                else:
-                    code += 1
+        return 0, 0
+
+    with open(location, 'rb') as f:
+        return lines_count(iter(lambda: f.read(BLOCK_SIZE), b''))
+
+
+def lines_count(blocks):
+    """
+    Return a tuple of (code, comment) line counts for an iterable of
+    `blocks` of bytes. A line is blank if it has only whitespace. A non-blank
+    line is a comment if its first non-whitespace characters are one of /,
+    #, @rem, ; or *. Other non-blank lines are code.
+
+    Rather than processing each line in turn, whole blocks of lines are
+    scanned at once: lines are counted by counting line ends and the blank
+    and comment lines are counted with regular expressions. Each scanned
+    block ends with a line end and the partial last line of a block is
+    carried over to the next block.
+
+    For example:
+    >>> lines_count(['int a;\\n  // a\\n\\n  \\t\\n# b', '\\nc;\\n'])
+    (2, 2)
+    """
+    lines = 0
+    blank = 0
+    comment = 0
+    tail = b''
+    for block in blocks:
+        if tail:
+            block = tail + block
+        end = block.rfind(b'\n') + 1
+        tail = block[end:]
+        if end:
+            # prefix with a line end such that each line follows a line end
+            block = b'\n' + block[:end]
+            lines += block.count(b'\n') - 1
+            blank += len(blank_lines(block))
+            comment += len(comment_lines(block))
+
+    code = lines - blank - comment
+    # the last line without a line end
+    tail = tail.strip()
+    if tail:
+        if tail.startswith(COMMENT_PREFIXES):
+            comment += 1
+        else:
+            code += 1
     return code, comment
 
 
@@ -73,17 +208,148 @@ filetype.counting_functions.update({
 })
 
 
+# cache of {directory: (code, comment)} cumulative line counts for each
+# directory of the trees walked by get_lines_count(). Clear it when a tree
+# changes.
+directories_lines_count_cache = {}
+
+# maximum number of directories kept in directories_lines_count_cache
+MAX_CACHED_DIRECTORIES = 100000
+
+
+def get_lines_count(location):
+    """
+    Return a tuple of (code, comment) cumulative line counts in the whole
+    directory tree at `location` in a single walk. Use (0, 0) if `location`
+    is not a source file. The counts of each directory of a walked tree are
+    cached such that the counts of a tree or of any of its sub-directories
+    are then returned without walking it again.
+    """
+    if filetype.is_dir(location):
+        cached = directories_lines_count_cache.get(os.path.normpath(location))
+        if cached is not None:
+            return cached
+
+    result = tree_lines_count(location)
+    if result.directories:
+        cache = directories_lines_count_cache
+        if len(cache) + len(result.directories) > MAX_CACHED_DIRECTORIES:
+            cache.clear()
+        cache.update(result.directories)
+    return result.code, result.comment
+
+
 def get_code_lines_count(location):
     """
     Return the cumulative number of lines of code in the whole directory tree
-    at `location`. Use 0 if `location` is not a source file.
+    at `location`. Use 0 if `location` is not a source file. Use
+    get_lines_count() to get both code and comment lines in a single walk.
     """
-    return counter(location, 'code_lines')
+    code, _comment = get_lines_count(location)
+    return code
 
 
 def get_comment_lines_count(location):
     """
     Return the cumulative number of lines of comments in the whole directory
-    tree at `location`. Use 0 if `location` is not a source file.
+    tree at `location`. Use 0 if `location` is not a source file. Use
+    get_lines_count() to get both code and comment lines in a single walk.
+    """
+    _code, comment = get_lines_count(location)
+    return comment
+
+
+# number of files counted at once in a worker process
+BATCH_SIZE = 100
+
+
+TreeLinesCount = namedtuple('TreeLinesCount', 'code comment directories')
+
+
+def _files_lines_count(locations):
     """
-    return counter(location, 'comment_lines')
+    Return a list of (location, (code, comment)) for a `locations` list.
+    """
+    return [(location, file_lines_count(location)) for location in locations]
+
+
+def _batches(location, batch_size, directories):
+    """
+    Yield lists of `batch_size` regular file paths from a walk of the
+    `location` directory tree, appending each walked directory to a
+    `directories` list. Does not follow links.
+    """
+    batch = []
+    for top, _dirs, files in os.walk(location):
+        directories.append(top)
+        for name in files:
+            path = os.path.join(top, name)
+            if filetype.is_file(path):
+                batch.append(path)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def tree_lines_count(location, processes=None, batch_size=BATCH_SIZE):
+    """
+    Return a TreeLinesCount of (code, comment, directories) for the whole
+    directory tree at `location` in a single walk, where code and comment are
+    the total number of lines of code and comments and directories is a
+    mapping of {directory path: (code, comment)} with the cumulative counts
+    of each directory of the tree. Files are counted in batches of
+    `batch_size` files in a pool of `processes` processes if `processes` is
+    more than one.
+
+    The totals are the same as the filetype.counter() cumulative counts of
+    code_lines and comment_lines.
+    """
+    if filetype.is_file(location):
+        code, comment = file_lines_count(location)
+        return TreeLinesCount(code, comment, {})
+
+    if not filetype.is_dir(location):
+        return TreeLinesCount(0, 0, {})
+
+    location = os.path.normpath(location)
+    totals = {}
+    walked = []
+
+    pool = None
+    batches = _batches(location, batch_size, walked)
+    if processes and processes > 1:
+        pool = Pool(processes)
+        results = pool.imap_unordered(_files_lines_count, batches)
+    else:
+        results = (_files_lines_count(batch) for batch in batches)
+
+    try:
+        for counts in results:
+            for path, (code, comment) in counts:
+                # roll up the counts to each parent directory up to the root
+                parent = os.path.dirname(path)
+                while True:
+                    total = totals.get(parent)
+                    if total is None:
+                        total = totals[parent] = [0, 0]
+                    total[0] += code
+                    total[1] += comment
+                    if parent == location:
+                        break
+                    parent = os.path.dirname(parent)
+        if pool:
+            pool.close()
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    # also report directories without files
+    for path in walked:
+        totals.setdefault(path, [0, 0])
+
+    directories = dict((path, tuple(total)) for path, total in totals.items())
+    code, comment = directories[location]
+    return TreeLinesCount(code, comment, directories)
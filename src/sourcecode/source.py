@@ -24,7 +24,10 @@
 
 from __future__ import absolute_import, print_function
 
+from collections import OrderedDict
 import logging
+import subprocess
+import threading
 
 from commoncode import command
 from commoncode import fileutils
@@ -39,12 +42,21 @@ LOG = logging.getLogger(__name__)
 
 bin_dir = os.path.join(os.path.dirname(__file__), 'bin')
 
+# seconds after which a ctags run is killed
+CTAGS_TIMEOUT = 600
+
+# size of the ctags stdout pipe buffer
+BUFFER_SIZE = 2 ** 16
+
+# maximum number of bytes of ctags stderr kept in memory
+MAX_STDERR = 2 ** 16
+
 
 class Source(object):
     """
     Source code object.
     """
-    def __init__(self, sourcefile):
+    def __init__(self, sourcefile, collect_tags=True):
         # yield nothing if we do not have a proper command
         self.sourcefile = sourcefile
 
@@ -56,47 +68,196 @@ class Source(object):
         self.local_functions = []
         self.global_functions = []
 
-        self._collect_and_parse_tags()
+        if collect_tags:
+            self._collect_and_parse_tags()
+
+    @classmethod
+    def from_many(cls, sourcefiles, batch_size=1000):
+        """
+        Return a mapping of {source file: Source} for a `sourcefiles` list of
+        source file paths, running a single ctags command for each batch of
+        `batch_size` files rather than one command per file.
+        """
+        sources = OrderedDict()
+        for sourcefile in sourcefiles:
+            sources[sourcefile] = cls(sourcefile, collect_tags=False)
+
+        paths = list(sources)
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            for path, name, is_local in collect_tags(batch):
+                source = sources.get(path)
+                if source is None:
+                    continue
+                if is_local:
+                    source.local_functions.append(name)
+                else:
+                    source.global_functions.append(name)
+        return sources
 
     def symbols(self):
         glocal = flatten([self.local_functions, self.global_functions])
         return sorted(glocal)
 
     def _collect_and_parse_tags(self):
-        ctags_args = ['--fields=K',
-                      '--c-kinds=fp',
-                      '-f', '-',
-                      self.sourcefile
-                      ]
-        ctags_temp_dir = fileutils.get_temp_dir(base_dir='ctags')
-        envt = {'TMPDIR': ctags_temp_dir}
+        for _path, name, is_local in collect_tags([self.sourcefile]):
+            if is_local:
+                self.local_functions.append(name)
+            else:
+                self.global_functions.append(name)
+
+
+def collect_tags(sourcefiles, timeout=CTAGS_TIMEOUT):
+    """
+    Yield (path, name, is_local) tuples for the functions and prototypes
+    tags found by a single ctags run on a `sourcefiles` list of paths, where
+    is_local is True for functions with a file scope.
+
+    The list of files is fed to ctags on its stdin and its output is parsed
+    as it is read from a pipe: tags are yielded for each file in turn, sorted
+    by tag line. stderr is kept in memory up to MAX_STDERR bytes. Raise an
+    Exception if ctags fails or does not complete within `timeout` seconds.
+    """
+    cmd_loc, _bin_dir, lib_dir = command.get_locations('ctags', bin_dir)
+    ctags_temp_dir = fileutils.get_temp_dir(base_dir='ctags')
+    # ctags still needs a temp dir for its own temp files
+    envt = command.get_env({'TMPDIR': ctags_temp_dir}, lib_dir) or None
+    ctags_args = [cmd_loc or 'ctags',
+                  '--fields=K',
+                  '--c-kinds=fp',
+                  # we sort the tags of each file ourselves
+                  '--sort=no',
+                  '-f', '-',
+                  '-L', '-',
+                  ]
+    proc = subprocess.Popen(ctags_args, env=envt, bufsize=BUFFER_SIZE,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, shell=command.on_windows)
+    timed_out = []
+
+    def kill():
+        timed_out.append(True)
+        _kill(proc)
+
+    timer = threading.Timer(timeout, kill)
+    stderr = []
+    # feed the files list and drain stderr in threads to avoid deadlocks
+    threads = [
+        threading.Thread(target=_write_lines, args=(proc.stdin, sourcefiles)),
+        threading.Thread(target=_read_bounded, args=(proc.stderr, stderr)),
+    ]
+    try:
+        timer.start()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # ctags emits the tags of each file together: collect the tags lines
+        # of a file until the next file starts
+        current = None
+        lines = []
+        for line in iter(proc.stdout.readline, b''):
+            tag = parse_tag(line)
+            if not tag:
+                continue
+            path = tag[0]
+            if path != current:
+                for tag in _sorted_tags(lines):
+                    yield tag
+                current = path
+                lines = []
+            lines.append(line.strip())
+
+        for tag in _sorted_tags(lines):
+            yield tag
+
+        rc = proc.wait()
+        for thread in threads:
+            thread.join()
+        if timed_out:
+            raise Exception('ctags: timeout after %(timeout)r seconds' % locals())
+        if rc != 0:
+            raise Exception(b''.join(stderr))
+    finally:
+        timer.cancel()
+        _kill(proc)
+        fileutils.delete(ctags_temp_dir)
+
+
+def _sorted_tags(lines):
+    """
+    Yield parsed tags from a list of tag `lines` of a single file in the
+    sorted and de-duplicated order that ctags uses.
+    """
+    for line in sorted(set(lines)):
+        yield parse_tag(line)
+
+
+def _write_lines(output, lines):
+    try:
+        for line in lines:
+            output.write(line + b'\n')
+    except IOError:
+        # the process has terminated
+        pass
+    finally:
+        try:
+            output.close()
+        except IOError:
+            pass
+
+
+def _read_bounded(input, chunks, max_size=None):
+    """
+    Read all the content of an `input` file-like object, appending chunks to
+    a `chunks` list up to `max_size` bytes and discarding the rest.
+    """
+    max_size = max_size or MAX_STDERR
+    size = 0
+    for chunk in iter(lambda: input.read(BUFFER_SIZE), b''):
+        if size < max_size:
+            chunks.append(chunk[:max_size - size])
+            size += len(chunk)
+
+
+def _kill(proc):
+    if proc.poll() is None:
         try:
-            rc, stdo, err = command.execute('ctags', ctags_args, env=envt,
-                                             root_dir=bin_dir, to_files=True)
-            if rc != 0:
-                raise Exception(open(err).read())
-
-            with open(stdo, 'rb') as lines:
-                for line in lines:
-                    if 'cannot open temporary file' in line:
-                        raise Exception('ctags: cannot open temporary file '
-                                        ': Permission denied')
-
-                    if line.startswith('!'):
-                        continue
-
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    splitted = line.split('\t')
-
-                    if (line.endswith('function\tfile:')
-                        or line.endswith('prototype\tfile:')):
-                        self.local_functions.append(splitted[0])
-
-                    elif (line.endswith('function')
-                          or line.endswith('prototype')):
-                        self.global_functions.append(splitted[0])
-        finally:
-            fileutils.delete(ctags_temp_dir)
+            proc.kill()
+        except OSError:
+            pass
+        proc.wait()
+
+
+def parse_tag(line):
+    """
+    Return a (path, name, is_local) tuple for a ctags output `line` for a
+    function or prototype or None.
+
+    For example:
+    >>> parse_tag('main\\tmain.c\\t/^int main(void)$/;"\\tfunction')
+    ('main.c', 'main', False)
+    >>> parse_tag('usage\\tmain.c\\t/^static void usage(void)$/;"\\tfunction\\tfile:')
+    ('main.c', 'usage', True)
+    >>> parse_tag('!_TAG_FILE_SORTED\\t1\\t/0=unsorted/')
+    """
+    if 'cannot open temporary file' in line:
+        raise Exception('ctags: cannot open temporary file '
+                        ': Permission denied')
+
+    if line.startswith('!'):
+        return
+
+    line = line.strip()
+    if not line:
+        return
+
+    splitted = line.split('\t')
+
+    if (line.endswith('function\tfile:')
+        or line.endswith('prototype\tfile:')):
+        return splitted[1], splitted[0], True
+
+    elif (line.endswith('function')
+          or line.endswith('prototype')):
+        return splitted[1], splitted[0], False
@@ -0,0 +1,62 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+import random
+
+from bitarray import bitarray
+
+
+"""
+Helpers shared by the samecode tests.
+"""
+
+
+def random_hashes(count, size_in_bits, seed=42):
+    """
+    Return a list of `count` random bitarrays of `size_in_bits`, always the
+    same for a given `seed`.
+    """
+    rnd = random.Random(seed)
+    return [bitarray([rnd.randint(0, 1) for _ in range(size_in_bits)])
+            for _ in range(count)]
+
+
+class FileCreationMixin(object):
+    """
+    Mixin for FileBasedTesting test cases that create files in a temp
+    directory.
+    """
+
+    def create_file(self, content, name='file'):
+        """
+        Return the location of a new `name` file with `content` in a new
+        temp directory.
+        """
+        location = os.path.join(self.get_temp_dir(), name)
+        with open(location, 'wb') as f:
+            f.write(content)
+        return location
@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import time
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import benchmark
+
+
+class TestBenchmark(FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_corpus_is_deterministic(self):
+        assert benchmark.corpus(1000, seed=1) == benchmark.corpus(1000, seed=1)
+        assert benchmark.corpus(1000, seed=1) != benchmark.corpus(1000, seed=2)
+
+    def test_run(self):
+        results = benchmark.run(corpus_sizes=(500,),
+            variants=['BitAverageHaloHash', 'BitQuartileHaloHash'],
+            sizes_in_bits=(32, 2048), isolated=False)
+        cases = [benchmark.case_key(r) for r in results['results']]
+        # there are no 2048 bits variants
+        expected = [
+            ('BitAverageHaloHash', 32, 500),
+            ('BitQuartileHaloHash', 32, 500),
+        ]
+        assert expected == cases
+        for result in results['results']:
+            assert result['tokens_per_second'] > 0
+            assert result['query_us'] > 0
+
+    def test_run_reports_failed_cases(self):
+        def failing_case(variant, size_in_bits, tokens):
+            raise MemoryError()
+
+        run_case = benchmark.run_case
+        try:
+            benchmark.run_case = failing_case
+            for isolated in (False, True):
+                results = benchmark.run(corpus_sizes=(100,),
+                    variants=['BitAverageHaloHash'], sizes_in_bits=(32,),
+                    isolated=isolated)
+                result, = results['results']
+                assert ('BitAverageHaloHash', 32, 100) == benchmark.case_key(result)
+                assert 'MemoryError' in result['error']
+        finally:
+            benchmark.run_case = run_case
+
+    def test_run_isolated_case_reports_crashes_and_timeouts(self):
+        def crashing_case(variant, size_in_bits, tokens):
+            os._exit(9)
+
+        def slow_case(variant, size_in_bits, tokens):
+            time.sleep(30)
+
+        run_case = benchmark.run_case
+        try:
+            benchmark.run_case = crashing_case
+            result = benchmark.run_isolated_case('BitAverageHaloHash', 32, ['a'])
+            assert 'code: 9' in result['error']
+
+            benchmark.run_case = slow_case
+            result = benchmark.run_isolated_case('BitAverageHaloHash', 32, ['a'], timeout=1)
+            assert 'Timed out' in result['error']
+        finally:
+            benchmark.run_case = run_case
+
+    def test_new_hash_rejects_unsupported_sizes(self):
+        self.assertRaises(ValueError, benchmark.new_hash, 'BitAverageHaloHash', 2048)
+        self.assertRaises(ValueError, benchmark.new_hash, 'BucketAverageHaloHash', 96)
+        assert 1024 == benchmark.new_hash('BitQuartileHaloHash', 1024).size_in_bits
+
+    def test_compare_reports_failed_and_missing_cases(self):
+        baseline = benchmark.run(corpus_sizes=(100,),
+            variants=['BitAverageHaloHash', 'BucketAverageHaloHash'],
+            sizes_in_bits=(32,), isolated=False)
+        current = json.loads(json.dumps(baseline))
+        current['results'][0] = benchmark.failed_case('MemoryError')
+        current['results'][0].update(variant='BitAverageHaloHash',
+                                     size_in_bits=32, tokens=100)
+        del current['results'][1]
+        expected = [
+            ('BitAverageHaloHash', 32, 100, 'error', None, 'MemoryError'),
+            ('BucketAverageHaloHash', 32, 100, 'missing', None, None),
+        ]
+        assert expected == benchmark.compare(baseline, current, tolerance=100)
+
+    def test_main_writes_results_and_detects_regressions(self):
+        output = os.path.join(self.get_temp_dir(), 'results.json')
+        args = ['--tokens', '200', '--variant', 'BucketAverageHaloHash',
+                '--bits', '32', '--output', output]
+        assert 0 == benchmark.main(args)
+        with open(output, 'rb') as inp:
+            results = json.load(inp)
+        assert 1 == len(results['results'])
+
+        for result in results['results']:
+            result['tokens_per_second'] *= 1000
+        baseline = os.path.join(self.get_temp_dir(), 'baseline.json')
+        with open(baseline, 'wb') as out:
+            json.dump(results, out)
+        assert 1 == benchmark.main(args + ['--baseline', baseline])
@@ -0,0 +1,162 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+import time
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import cache
+from samecode import fingerprint
+from samecode import hash as commoncode_hash
+
+from samecode_testutils import FileCreationMixin
+
+
+class TestFingerprintCache(FileCreationMixin, FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def get_cache(self, **kwargs):
+        return cache.FingerprintCache(
+            os.path.join(self.get_temp_dir(), 'cache.db'), **kwargs)
+
+    def test_get_put_and_persistence(self):
+        test_file = self.create_file('some content')
+        db = os.path.join(self.get_temp_dir(), 'cache.db')
+        with cache.FingerprintCache(db) as fpc:
+            assert None == fpc.get(test_file, 'md5')
+            fpc.put(test_file, 'md5', 'abc')
+            fpc.put(test_file, 'state', {'column_totals': [1, 2]})
+            assert 'abc' == fpc.get(test_file, 'md5')
+            assert 1 == fpc.hits
+            assert 1 == fpc.misses
+
+        with cache.FingerprintCache(db) as fpc:
+            assert 2 == len(fpc)
+            assert {'column_totals': [1, 2]} == fpc.get(test_file, 'state')
+
+    def test_stale_entries_are_not_returned(self):
+        test_file = self.create_file('some content')
+        with self.get_cache() as fpc:
+            fpc.put(test_file, 'md5', 'abc')
+            with open(test_file, 'ab') as f:
+                f.write('more')
+            assert None == fpc.get(test_file, 'md5')
+            assert 0 == len(fpc)
+
+            fpc.put(test_file, 'md5', 'abc')
+            # same size, different mtime
+            stat = os.stat(test_file)
+            os.utime(test_file, (stat.st_atime, stat.st_mtime + 10))
+            assert None == fpc.get(test_file, 'md5')
+
+    def test_invalidate_clear_and_evict(self):
+        with self.get_cache(max_entries=2) as fpc:
+            locations = []
+            for i in range(4):
+                location = os.path.join(self.get_temp_dir(), 'f%d' % i)
+                with open(location, 'wb') as f:
+                    f.write(str(i))
+                fpc.put(location, 'md5', str(i))
+                locations.append(location)
+                time.sleep(0.01)
+
+            fpc.invalidate(locations[3])
+            assert None == fpc.get(locations[3], 'md5')
+            # refresh the oldest entry
+            assert '0' == fpc.get(locations[0], 'md5')
+            assert 1 == fpc.evict()
+            assert '0' == fpc.get(locations[0], 'md5')
+            assert None == fpc.get(locations[1], 'md5')
+            assert '2' == fpc.get(locations[2], 'md5')
+
+            fpc.clear()
+            assert 0 == len(fpc)
+
+    def test_cached_multi_checksum(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        expected = commoncode_hash.multi_checksum(test_file)
+        with self.get_cache() as fpc:
+            assert expected == cache.cached_multi_checksum(fpc, test_file)
+            assert 4 == fpc.misses
+            assert expected == cache.cached_multi_checksum(fpc, test_file)
+            assert 4 == fpc.hits
+            assert expected['sha1'] == cache.cached_checksum(fpc, test_file, 'sha1')
+
+    def test_get_or_compute(self):
+        test_file = self.create_file('some content')
+        calls = []
+
+        def compute(location):
+            calls.append(location)
+            return 42
+
+        with self.get_cache() as fpc:
+            assert 42 == fpc.get_or_compute(test_file, 'answer', compute)
+            assert 42 == fpc.get_or_compute(test_file, 'answer', compute)
+            assert [test_file] == calls
+
+    def test_values_computed_while_a_file_is_modified_are_stale(self):
+        test_file = self.create_file('some content')
+
+        def compute(location):
+            value = commoncode_hash.md5(location)
+            with open(location, 'ab') as f:
+                f.write('more')
+            return value
+
+        with self.get_cache() as fpc:
+            stale = fpc.get_or_compute(test_file, 'md5', compute)
+            assert None == fpc.get(test_file, 'md5')
+            assert commoncode_hash.md5(test_file) != stale
+
+    def test_cached_multi_checksum_stats_a_file_once(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        calls = []
+        stat_key = cache.stat_key
+
+        def counting_stat_key(location):
+            calls.append(location)
+            return stat_key(location)
+
+        with self.get_cache() as fpc:
+            cache.cached_multi_checksum(fpc, test_file)
+            try:
+                cache.stat_key = counting_stat_key
+                cache.cached_multi_checksum(fpc, test_file)
+            finally:
+                cache.stat_key = stat_key
+            assert [test_file] == calls
+            assert 4 == fpc.hits
+
+    def test_cached_fingerprint(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        expected = fingerprint.fingerprint_file(test_file, 'words', 2).hexdigest()
+        with self.get_cache() as fpc:
+            assert expected == cache.cached_fingerprint(fpc, test_file, 'words', 2)
+            assert expected == cache.cached_fingerprint(fpc, test_file, 'words', 2)
+            assert 1 == fpc.hits
+            assert expected != cache.cached_fingerprint(fpc, test_file, 'words', 3)
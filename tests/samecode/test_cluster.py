@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import random
+from unittest import TestCase
+
+from bitarray import bitarray
+
+from samecode import cluster
+from samecode import halohash
+from samecode import index
+
+
+class TestCluster(TestCase):
+
+    def get_corpus(self):
+        rnd = random.Random(17)
+        words = [str(x) for x in range(5000)]
+        items = []
+        for family in range(20):
+            base = rnd.sample(words, 200)
+            for member in range(rnd.randint(1, 5)):
+                tokens = list(base)
+                # a few edits for each family member
+                for _ in range(rnd.randint(0, 3)):
+                    tokens[rnd.randrange(len(tokens))] = rnd.choice(words)
+                fid = 'f%d-m%d' % (family, member)
+                items.append((fid, halohash.BitAverageHaloHash(tokens, size_in_bits=128).digest()))
+        rnd.shuffle(items)
+        return items
+
+    def brute_force(self, items, max_distance):
+        uf = cluster.UnionFind()
+        for i, (id1, h1) in enumerate(items):
+            uf.add(id1)
+            for id2, h2 in items[i + 1:]:
+                bits1 = halohash.as_bitarray(h1)
+                bits2 = halohash.as_bitarray(h2)
+                if halohash.hamming_distance(bits1, bits2) <= max_distance:
+                    uf.union(id1, id2)
+        return sorted(sorted(g) for g in uf.groups() if len(g) > 1)
+
+    def test_cluster_is_same_as_brute_force(self):
+        items = self.get_corpus()
+        expected = self.brute_force(items, 12)
+        assert expected
+        assert expected == list(cluster.cluster(items, 12))
+
+    def test_cluster_families(self):
+        items = self.get_corpus()
+        for group in cluster.cluster(items, 12):
+            assert 1 == len(set(fid.split('-')[0] for fid in group))
+
+    def test_cluster_with_lsh_index(self):
+        items = self.get_corpus()
+        expected = self.brute_force(items, 7)
+        lsh = index.HaloIndex(size_in_bits=128, bands=8)
+        assert expected == list(cluster.cluster(items, 7, index=lsh))
+
+    def test_near_duplicate_pairs_streams_from_a_generator(self):
+        def items():
+            for i in range(100):
+                yield i, bitarray(format(i, '016b'))
+        pairs = list(cluster.near_duplicate_pairs(items(), 0))
+        assert [] == pairs
+        pairs = list(cluster.near_duplicate_pairs(items(), 1))
+        assert (0, 1, 1) in pairs
+        assert all(id1 < id2 for id1, id2, _ in pairs)
+
+    def test_default_index(self):
+        for size_in_bits in (32, 64, 128, 160, 256, 512):
+            idx = cluster.default_index(size_in_bits)
+            assert idx.substring_bits <= 16
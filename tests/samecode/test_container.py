@@ -0,0 +1,98 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+from StringIO import StringIO
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import container
+from samecode.halohash import BitAverageHaloHash
+from samecode.halohash import BitQuartileHaloHash
+
+
+def get_hashes(count, size_in_bits=128):
+    return [('h%d' % i, BitAverageHaloHash(
+                ['a', 'b', str(i)] * (i + 1), size_in_bits=size_in_bits))
+            for i in range(count)]
+
+
+class TestContainer(FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_write_and_read(self):
+        hashes = get_hashes(50)
+        location = os.path.join(self.get_temp_dir(), 'hashes.halo')
+        with container.ContainerWriter.for_hash(location, hashes[0][1]) as writer:
+            for hid, halo in hashes:
+                writer.add(hid, halo)
+        assert 50 == writer.count
+        # header + 50 records of 16 bytes digests
+        assert 8 + 2 + 20 + 4 + 50 * (12 + 16) + 10 * 2 + 40 * 3 == os.path.getsize(location)
+
+        with container.ContainerReader(location) as reader:
+            assert 'BitAverageHaloHash' == reader.hash_type
+            assert 128 == reader.size_in_bits
+            records = list(reader)
+
+        expected = [container.Record(hid, halo.digest(), halo.elements_count())
+                    for hid, halo in hashes]
+        assert expected == records
+
+    def test_dump_and_load_stream_with_digests(self):
+        hashes = [(u'\xe9', '\x01\x02\x03\x04'), ('x', '\xff\x00\xff\x00')]
+        stream = StringIO()
+        assert 2 == container.dump(stream, hashes, 'BitQuartileHaloHash', 32)
+        stream.seek(0)
+        expected = [
+            container.Record(u'\xe9'.encode('utf-8'), '\x01\x02\x03\x04', 0),
+            container.Record('x', '\xff\x00\xff\x00', 0),
+        ]
+        assert expected == list(container.load(stream))
+
+    def test_empty_container(self):
+        stream = StringIO()
+        container.dump(stream, [], 'BitAverageHaloHash', 64)
+        stream.seek(0)
+        assert [] == list(container.load(stream))
+
+    def test_add_incompatible_hashes_fails(self):
+        writer = container.ContainerWriter(StringIO(), 'BitAverageHaloHash', 128)
+        self.assertRaises(ValueError, writer.add, 'a', '\x00' * 4)
+        halo = BitQuartileHaloHash(['a'], size_in_bits=128)
+        self.assertRaises(ValueError, writer.add, 'a', halo)
+        halo = BitAverageHaloHash(['a'], size_in_bits=64)
+        self.assertRaises(ValueError, writer.add, 'a', halo)
+
+    def test_invalid_and_truncated_containers_fail(self):
+        stream = StringIO()
+        container.dump(stream, get_hashes(3), 'BitAverageHaloHash', 128)
+        data = stream.getvalue()
+        self.assertRaises(ValueError, lambda: list(container.load(StringIO(data[:-1]))))
+        self.assertRaises(ValueError, lambda: list(container.load(StringIO(data[:12]))))
+        self.assertRaises(ValueError, lambda: list(container.load(StringIO('X' + data[1:]))))
+        unsupported = data[:8] + '\x03\x00' + data[10:]
+        self.assertRaises(ValueError, lambda: list(container.load(StringIO(unsupported))))
@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+from unittest import TestCase
+from unittest.case import skipIf
+
+from samecode import distance
+from samecode import halohash
+
+from samecode_testutils import random_hashes
+
+
+@skipIf(not distance.numpy, 'Numpy is not installed')
+class TestDistance(TestCase):
+
+    def test_pack_words_pads_digests(self):
+        packed = distance.pack_words(['\xff' * 10, '\x01' * 10])
+        assert (2, 2) == packed.shape
+        assert [80, 10] == distance.popcount(packed).sum(axis=1).tolist()
+        assert packed is distance.pack_words(packed)
+
+    def test_distance_matrix_is_same_as_pairwise(self):
+        queries = random_hashes(13, 200, seed=1)
+        references = random_hashes(37, 200, seed=2)
+        expected = [[halohash.hamming_distance(q, r) for r in references]
+                    for q in queries]
+        assert expected == distance.distance_matrix(queries, references, chunk_size=5).tolist()
+        assert expected == distance.distance_matrix(queries, references, chunk_size=5, processes=2).tolist()
+
+    def test_top_k_is_same_as_sorted_pairwise(self):
+        queries = random_hashes(11, 64, seed=3)
+        references = random_hashes(50, 64, seed=4)
+        references.extend(references[:5])
+        expected_indices = []
+        expected_distances = []
+        for q in queries:
+            ranked = sorted((halohash.hamming_distance(q, r), i)
+                            for i, r in enumerate(references))[:7]
+            expected_indices.append([i for _, i in ranked])
+            expected_distances.append([d for d, _ in ranked])
+
+        for processes in (None, 2):
+            indices, distances = distance.top_k(
+                queries, references, k=7, chunk_size=4, processes=processes)
+            assert expected_indices == indices.tolist()
+            assert expected_distances == distances.tolist()
+
+    def test_top_k_with_k_larger_than_references_and_empty_inputs(self):
+        queries = random_hashes(2, 32, seed=5)
+        references = random_hashes(3, 32, seed=6)
+        indices, distances = distance.top_k(queries, references, k=10)
+        assert (2, 3) == indices.shape
+        indices, distances = distance.top_k([], references, k=10)
+        assert (0, 3) == indices.shape
+        assert (2, 0) == distance.distance_matrix(queries, []).shape
+
+    def test_pack_words_with_halohashes_and_different_sizes(self):
+        a = halohash.BitAverageHaloHash(['a', 'b'], size_in_bits=128)
+        b = halohash.BitAverageHaloHash(['a', 'c'], size_in_bits=128)
+        assert [[a.distance(b)]] == distance.distance_matrix([a], [b]).tolist()
+        self.assertRaises(ValueError, distance.pack_words, ['\0' * 8, '\0' * 16])
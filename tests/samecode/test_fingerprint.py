@@ -0,0 +1,110 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import fingerprint
+from samecode.halohash import BitAverageHaloHash
+from samecode.halohash import BitQuartileHaloHash
+
+from samecode_testutils import FileCreationMixin
+
+
+class TestFingerprintFile(FileCreationMixin, FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_tokens(self):
+        test_file = self.create_file('  int a = 1;\n\n  return a;\n')
+        assert ['int a = 1;', 'return a;'] == list(fingerprint.tokens(test_file))
+        assert ['int a = 1;\nreturn a;'] == list(fingerprint.tokens(test_file, ngram=2))
+        expected = ['int a', 'a 1', '1 return', 'return a']
+        assert expected == list(fingerprint.tokens(test_file, 'words', 2))
+        expected = ['  in', ' int', 'int ']
+        assert expected == list(fingerprint.tokens(test_file, 'bytes', 4))[:3]
+
+    def test_byte_ngrams_across_chunks(self):
+        content = ''.join(chr(i % 251) for i in range(10000))
+        test_file = self.create_file(content)
+        expected = [content[i:i + 5] for i in range(len(content) - 4)]
+        original = fingerprint.CHUNK_SIZE
+        try:
+            fingerprint.CHUNK_SIZE = 97
+            assert expected == list(fingerprint.byte_ngrams(test_file, 5))
+            fingerprint.CHUNK_SIZE = 1
+            assert expected == list(fingerprint.byte_ngrams(test_file, 5))
+        finally:
+            fingerprint.CHUNK_SIZE = original
+        assert list(content) == list(fingerprint.byte_ngrams(test_file, 1))
+
+    def test_words_across_chunks(self):
+        content = ''.join('word%d, \t%s\n' % (i, 'x' * (i % 7)) for i in range(2000))
+        test_file = self.create_file(content)
+        expected = [m.group() for m in fingerprint.words_splitter(content)]
+        original = fingerprint.CHUNK_SIZE
+        try:
+            for chunk_size in (1, 5, 97):
+                fingerprint.CHUNK_SIZE = chunk_size
+                assert expected == list(fingerprint.words(test_file))
+        finally:
+            fingerprint.CHUNK_SIZE = original
+
+    def test_long_lines_and_words_are_split(self):
+        test_file = self.create_file('a' * 25 + ' b\n' + 'c' * 20)
+        original = fingerprint.CHUNK_SIZE, fingerprint.MAX_TOKEN_LENGTH
+        try:
+            fingerprint.CHUNK_SIZE = 3
+            fingerprint.MAX_TOKEN_LENGTH = 10
+            expected = ['a' * 10, 'a' * 10, 'a' * 5 + ' b', 'c' * 10, 'c' * 10]
+            assert expected == list(fingerprint.lines(test_file))
+            expected = ['a' * 10, 'a' * 10, 'a' * 5, 'b', 'c' * 10, 'c' * 10]
+            assert expected == list(fingerprint.words(test_file))
+        finally:
+            fingerprint.CHUNK_SIZE, fingerprint.MAX_TOKEN_LENGTH = original
+
+    def test_tokens_with_invalid_arguments(self):
+        test_file = self.create_file('a')
+        self.assertRaises(ValueError, fingerprint.tokens, test_file, 'foo')
+        self.assertRaises(ValueError, fingerprint.tokens, test_file, 'words', 0)
+
+    def test_fingerprint_file_is_the_same_as_hashing_tokens(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        for kind, ngram in [('lines', 1), ('words', 3), ('bytes', 8)]:
+            for cls in (BitAverageHaloHash, BitQuartileHaloHash):
+                expected = cls(size_in_bits=64)
+                expected.update(list(fingerprint.tokens(test_file, kind, ngram)))
+                result = fingerprint.fingerprint_file(
+                    test_file, kind, ngram, size_in_bits=64, hash_class=cls)
+                assert expected.hexdigest() == result.hexdigest()
+
+    def test_fingerprint_file_similar_files_are_close(self):
+        content = ''.join('line %d of some source code\n' % i for i in range(200))
+        test_file1 = self.create_file(content)
+        h1 = fingerprint.fingerprint_file(test_file1, 'words', 3)
+        test_file2 = self.create_file(content.replace('line 17 ', 'line 1700 '))
+        h2 = fingerprint.fingerprint_file(test_file2, 'words', 3)
+        assert h1.distance(h2) < 16
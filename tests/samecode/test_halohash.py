@@ -24,6 +24,7 @@
 
 from __future__ import absolute_import, print_function
 
+import json
 from os.path import join
 from os.path import os
 from unittest import skipIf
@@ -166,6 +167,198 @@ class TestHalohash(FileBasedTesting):
         [a.update(unicode(x)) for x in xrange(4096)]
         assert 4096 == a.elements_count()
 
+    def test_column_sums_numpy_and_python_are_identical(self):
+        a = halohash.BitAverageHaloHash(None, size_in_bits=256)
+        a.update([str(x) for x in xrange(5000)])
+        digests = [h.digest() for h in a.hashes]
+        expected = halohash.column_sums(digests, use_numpy=False)
+        assert 256 == len(expected)
+        assert 5000 == a.elements_count()
+        if halohash.numpy:
+            assert expected == halohash.column_sums(digests, use_numpy=True)
+            assert expected == halohash._column_sums_numpy(digests, chunk_rows=7)
+
+    def test_BitQuartileHaloHash_with_and_without_numpy_are_identical(self):
+        tokens = [str(x) for x in xrange(3000)]
+        a = halohash.BitQuartileHaloHash(tokens, size_in_bits=256)
+        expected = a.hexdigest()
+        numpy = halohash.numpy
+        try:
+            halohash.numpy = None
+            assert expected == a.hexdigest()
+        finally:
+            halohash.numpy = numpy
+
+    def test_BitAverageHaloHash_streaming_is_identical(self):
+        tokens = [str(x) for x in xrange(5000)]
+        for size_in_bits in (32, 128, 512):
+            expected = halohash.BitAverageHaloHash(tokens, size_in_bits=size_in_bits)
+            streamed = halohash.BitAverageHaloHash(size_in_bits=size_in_bits, streaming=True)
+            for token in tokens:
+                streamed.update(token)
+            assert [] == streamed.hashes
+            assert len(streamed.pending_digests) < streamed.flush_size
+            assert 5000 == streamed.elements_count()
+            assert expected.hexdigest() == streamed.hexdigest()
+            assert 0 == expected.distance(streamed)
+
+    def test_BitQuartileHaloHash_streaming_is_identical(self):
+        tokens = [str(x) for x in xrange(3000)]
+        expected = halohash.BitQuartileHaloHash(tokens, size_in_bits=256)
+        streamed = halohash.BitQuartileHaloHash(tokens, size_in_bits=256, streaming=True)
+        assert [] == streamed.hashes
+        assert 3000 == streamed.elements_count()
+        assert expected.hexdigest() == streamed.hexdigest()
+
+    def test_BitAverageHaloHash_streaming_empty(self):
+        expected = halohash.BitAverageHaloHash(size_in_bits=128)
+        streamed = halohash.BitAverageHaloHash(size_in_bits=128, streaming=True)
+        assert 0 == streamed.elements_count()
+        assert expected.hash() == streamed.hash()
+
+    def check_weighted_updates(self, cls):
+        import random
+        rand = random.Random(3)
+        weights = dict(('token%d' % i, rand.randint(0, 20)) for i in range(3000))
+        tokens = [t for t, w in sorted(weights.items()) for _ in range(w)]
+        for streaming in (False, True):
+            expected = cls(['first'] + tokens, size_in_bits=64, streaming=streaming)
+            weighted = cls('first', size_in_bits=64, streaming=streaming)
+            weighted.update_weights(weights)
+            assert expected.elements_count() == weighted.elements_count()
+            assert expected.hash() == weighted.hash()
+
+            weighted = cls('first', size_in_bits=64, streaming=streaming)
+            for token, weight in weights.items():
+                weighted.update_weighted(token, weight)
+            assert expected.hash() == weighted.hash()
+
+    def test_BitAverageHaloHash_weighted_updates(self):
+        self.check_weighted_updates(halohash.BitAverageHaloHash)
+
+    def test_BitQuartileHaloHash_weighted_updates(self):
+        self.check_weighted_updates(halohash.BitQuartileHaloHash)
+
+    def test_weighted_updates_without_numpy(self):
+        numpy = halohash.numpy
+        try:
+            halohash.numpy = None
+            self.check_weighted_updates(halohash.BitAverageHaloHash)
+        finally:
+            halohash.numpy = numpy
+
+    def test_weighted_updates_with_invalid_weights(self):
+        a = halohash.BitAverageHaloHash(size_in_bits=64)
+        self.assertRaises(ValueError, a.update_weighted, 'a', -1)
+        self.assertRaises(ValueError, a.update_weighted, 'a', 1.5)
+        a.update_weighted('a', 0)
+        assert 0 == a.elements_count()
+
+    def test_bit_to_num_is_the_same_as_parsing_bits(self):
+        import random
+        rand = random.Random(1)
+        for length in range(0, 300, 7):
+            bits = bitarray([rand.random() > 0.5 for _ in range(length)])
+            expected = bits and int(bits.to01(), 2) or 0
+            assert expected == halohash.bit_to_num(bits)
+            little = bitarray(bits.to01() or [], endian='little')
+            assert expected == halohash.bit_to_num(little)
+
+    def test_intdigest_is_the_same_as_the_digest_number(self):
+        for size in (32, 64, 128, 256):
+            a = halohash.BitAverageHaloHash(['a', 'b', 'c'], size_in_bits=size)
+            assert halohash.bytes_to_num(a.digest()) == a.intdigest()
+            assert int(a.hash().to01(), 2) == a.intdigest()
+
+    def test_sum_buckets_numpy_and_python_are_identical(self):
+        a = halohash.BucketAverageHaloHash(None, size_in_bits=1024)
+        a.update([str(x) for x in xrange(5000)])
+        digests = [h.digest() for h in a.hashes]
+        for high in (1, 5, 8, 10):
+            expected = halohash.sum_buckets(digests, high, use_numpy=False)
+            assert 5000 == sum(expected[1])
+            # same as bucketing with bitarrays
+            buckets = [[] for _ in range(2 ** high)]
+            for d in digests:
+                bits = halohash.bitarray_from_bytes(d)
+                buckets[halohash.bit_to_num(bits[:high])].append(
+                    halohash.bit_to_num(bits[high:]))
+            assert [sum(b) for b in buckets] == expected[0]
+            assert [len(b) for b in buckets] == expected[1]
+            if halohash.numpy:
+                assert expected == halohash.sum_buckets(digests, high, use_numpy=True)
+                assert expected == halohash._sum_buckets_numpy(digests, high, chunk_rows=33)
+
+    def test_BucketAverageHaloHash_with_and_without_numpy_are_identical(self):
+        tokens = [str(x) for x in xrange(3000)]
+        a = halohash.BucketAverageHaloHash(tokens, size_in_bits=256)
+        expected = a.hexdigest()
+        numpy = halohash.numpy
+        try:
+            halohash.numpy = None
+            assert expected == a.hexdigest()
+        finally:
+            halohash.numpy = numpy
+
+    def check_merge_and_subtract(self, cls, size_in_bits):
+        tokens1 = [str(x) for x in xrange(2000)]
+        tokens2 = [str(x) for x in xrange(2000, 3000)]
+        tokens3 = [str(x) for x in xrange(3000, 3300)]
+
+        expected = cls(tokens1 + tokens2, size_in_bits=size_in_bits)
+        expected_state = expected.state()
+
+        package = cls(tokens1, size_in_bits=size_in_bits)
+        package.merge(cls(tokens2, size_in_bits=size_in_bits))
+        assert 3000 == package.elements_count()
+        assert expected.hexdigest() == package.hexdigest()
+        assert expected_state == package.state()
+
+        # an edit: a file removed and another added
+        package.merge(cls(tokens3, size_in_bits=size_in_bits))
+        package.subtract(cls(tokens2, size_in_bits=size_in_bits))
+        assert cls(tokens1 + tokens3, size_in_bits=size_in_bits).hexdigest() == package.hexdigest()
+
+        # states are JSON serializable
+        state = json.loads(json.dumps(expected_state))
+        assert expected.hexdigest() == cls.from_state(state).hexdigest()
+
+        # updates are still possible after a merge
+        restored = cls.from_state(cls(tokens1, size_in_bits=size_in_bits).state())
+        restored.update(tokens2)
+        assert expected.hexdigest() == restored.hexdigest()
+
+        try:
+            cls(tokens1, size_in_bits=size_in_bits).subtract(expected)
+            self.fail('ValueError not raised')
+        except ValueError:
+            pass
+
+    def test_BitAverageHaloHash_merge_and_subtract(self):
+        self.check_merge_and_subtract(halohash.BitAverageHaloHash, 128)
+
+    def test_BitQuartileHaloHash_merge_and_subtract(self):
+        self.check_merge_and_subtract(halohash.BitQuartileHaloHash, 256)
+
+    def test_BucketAverageHaloHash_merge_and_subtract(self):
+        self.check_merge_and_subtract(halohash.BucketAverageHaloHash, 64)
+
+    def test_merge_incompatible_hashes_fails(self):
+        a = halohash.BitAverageHaloHash(['a'], size_in_bits=128)
+        for other in (halohash.BitAverageHaloHash(['a'], size_in_bits=256),
+                      halohash.BitQuartileHaloHash(['a'], size_in_bits=128)):
+            try:
+                a.merge(other)
+                self.fail('ValueError not raised')
+            except ValueError:
+                pass
+
+        try:
+            halohash.BucketAverageHaloHash.from_state(a.state())
+            self.fail('ValueError not raised')
+        except ValueError:
+            pass
+
     def _random_HaloHash_test(self, module, size_in_bits, chunk_size):
         """
         Using two files created with dd from a Linux /dev/urandom as an input,
@@ -276,6 +469,58 @@ if PERF_TEST_ENABLED:
             expected = 'fe01e1389b43d115fb6b8f9a13eee937b599eebf4d4fac33866741bd33819466c38dc8c2cabdeb415179bb9fcff570d57d8ea80db21def5ebe7cc4b1b078c1e7'
             assert expected == a.hexdigest()
 
+        @skipUnless(PERF_TEST_ENABLED, 'Perf test disabled')
+        @skipIf(not numpy, 'Numpy is not installed')
+        def test_column_sums_numpy_vs_python_timing(self):
+            import timeit
+            for size in (10000, 100000, 1000000):
+                a = halohash.BitAverageHaloHash(None, size_in_bits=256)
+                a.update(['/project/path/test/a/' + str(x) for x in xrange(size)])
+                digests = [h.digest() for h in a.hashes]
+                timings = []
+                for use_numpy in (False, True):
+                    timings.append(timeit.timeit(
+                        lambda: halohash.column_sums(digests, use_numpy),
+                        number=1))
+                print('column_sums for %d tokens: python: %.3fs numpy: %.3fs '
+                      'speedup: %.1fx' % (size, timings[0], timings[1],
+                                          timings[0] / timings[1]))
+
+        @skipUnless(PERF_TEST_ENABLED, 'Perf test disabled')
+        def test_sum_buckets_timing(self):
+            import timeit
+
+            def bitarray_buckets(hashes, high):
+                # the previous bitarray and bit_to_num based implementation
+                buckets = {}
+                for d in hashes:
+                    hbv = halohash.bitarray_from_bytes(d)
+                    hi = halohash.bit_to_num(hbv[0:high])
+                    buckets.setdefault(hi, []).append(hbv[high:])
+                return [sum(map(halohash.bit_to_num, b)) for b in buckets.values()]
+
+            for size in (10000, 100000, 1000000):
+                a = halohash.BucketAverageHaloHash(None, size_in_bits=256)
+                a.update(['/project/path/test/a/' + str(x) for x in xrange(size)])
+                digests = [h.digest() for h in a.hashes]
+                before = timeit.timeit(lambda: bitarray_buckets(digests, 8), number=1)
+                python = timeit.timeit(
+                    lambda: halohash.sum_buckets(digests, 8, use_numpy=False), number=1)
+                vectorized = timeit.timeit(
+                    lambda: halohash.sum_buckets(digests, 8, use_numpy=True), number=1)
+                print('sum_buckets for %d tokens: bitarray: %.3fs integers: %.3fs '
+                      'numpy: %.3fs' % (size, before, python, vectorized))
+
+        @skipUnless(PERF_TEST_ENABLED, 'Perf test disabled')
+        def test_bit_to_num_timing(self):
+            import timeit
+            a = halohash.BitAverageHaloHash(size_in_bits=256)
+            a.update(['/project/path/test/a/' + str(x) for x in xrange(1000)])
+            bits = a.hash()
+            before = timeit.timeit(lambda: int(bits.to01(), 2), number=100000)
+            after = timeit.timeit(lambda: halohash.bit_to_num(bits), number=100000)
+            print('bit_to_num x 100000: to01: %.3fs bytes: %.3fs' % (before, after))
+
         @skipUnless(PERF_TEST_ENABLED, 'Perf test disabled')
         def test_profile_bit_average_1(self):
             # use the current implementation using numpy if present
@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import hashlib
+import os
+from unittest import TestCase
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import hash as commoncode_hash
+
+
+class TestHashers(TestCase):
+
+    def test_get_hasher(self):
+        hasher = commoncode_hash.get_hasher(128)
+        assert '0cc175b9c0f1b6a831c399e269772661' == hasher('a').hexdigest()
+        self.assertRaises(KeyError, commoncode_hash.get_hasher, 96)
+
+    def test_hashers_are_compact(self):
+        for bitsize in (16, 32, 64, 128, 160, 256, 384, 512):
+            hasher = commoncode_hash.get_hasher(bitsize)
+            h = hasher('a')
+            assert not hasattr(h, '__dict__')
+            assert bitsize // 8 == h.digest_size == len(h.digest())
+            assert None == hasher().digest()
+
+    def test_hash_many(self):
+        msgs = ['a', 'abcdefgh', 'abcdefghi', u'ascii', 'x' * 100]
+        msgs += [str(i) for i in range(5000)]
+        for bitsize in (32, 128, 160, 512):
+            hasher = commoncode_hash.get_hasher(bitsize)
+            expected = [hasher(m).digest() for m in msgs]
+            assert expected == hasher.hash_many(msgs)
+            assert expected == list(commoncode_hash.hash_many(iter(msgs), hasher))
+
+
+class TestChecksums(FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_checksums(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        content = open(test_file, 'rb').read()
+        assert hashlib.md5(content).hexdigest() == commoncode_hash.md5(test_file)
+        assert hashlib.sha1(content).hexdigest() == commoncode_hash.sha1(test_file)
+        assert hashlib.sha256(content).hexdigest() == commoncode_hash.sha256(test_file)
+        assert hashlib.sha512(content).hexdigest() == commoncode_hash.sha512(test_file)
+        assert hashlib.md5(content).hexdigest()[:16] == commoncode_hash.checksum(test_file, 64)
+
+    def test_multi_checksum_is_same_as_single_checksums(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        expected = {
+            'md5': commoncode_hash.md5(test_file),
+            'sha1': commoncode_hash.sha1(test_file),
+            'sha256': commoncode_hash.sha256(test_file),
+            'sha512': commoncode_hash.sha512(test_file),
+        }
+        assert expected == commoncode_hash.multi_checksum(test_file)
+        result = commoncode_hash.multi_checksum(test_file, ['sha1'], base64=True)
+        assert {'sha1': commoncode_hash.b64sha1(test_file)} == result
+
+    def test_multi_checksum_with_small_chunks_and_mmap(self):
+        test_file = self.get_test_loc('halohash/random/random1.txt')
+        expected = commoncode_hash.multi_checksum(test_file)
+        chunk_size = commoncode_hash.CHUNK_SIZE
+        mmap_size = commoncode_hash.MMAP_SIZE
+        try:
+            commoncode_hash.CHUNK_SIZE = 1000 - 1
+            assert expected == commoncode_hash.multi_checksum(test_file)
+            commoncode_hash.MMAP_SIZE = 1
+            assert expected == commoncode_hash.multi_checksum(test_file)
+        finally:
+            commoncode_hash.CHUNK_SIZE = chunk_size
+            commoncode_hash.MMAP_SIZE = mmap_size
+
+    def test_multi_checksum_on_empty_file_and_directory(self):
+        test_dir = self.get_temp_dir()
+        empty = os.path.join(test_dir, 'empty')
+        open(empty, 'wb').close()
+        assert None == commoncode_hash.md5(empty)
+        assert {'md5': None} == commoncode_hash.multi_checksum(empty, ['md5'])
+        assert None == commoncode_hash.multi_checksum(test_dir)
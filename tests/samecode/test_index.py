@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import random
+from unittest import TestCase
+
+from bitarray import bitarray
+
+from samecode import halohash
+from samecode import index
+
+from samecode_testutils import random_hashes
+
+
+def flip(bits, positions):
+    flipped = bitarray(bits)
+    for pos in positions:
+        flipped[pos] = not flipped[pos]
+    return flipped
+
+
+class TestHaloIndex(TestCase):
+
+    def test_query_is_exact_for_distances_below_bands_count(self):
+        rnd = random.Random(7)
+        hashes = random_hashes(500, 64)
+        # add some near duplicates
+        for i in range(50):
+            hashes.append(flip(hashes[i], rnd.sample(range(64), rnd.randint(0, 7))))
+
+        idx = index.HaloIndex(size_in_bits=64, bands=8)
+        for hid, bits in enumerate(hashes):
+            idx.add(hid, bits)
+        assert len(hashes) == len(idx)
+        assert 1.0 == idx.recall(7)
+
+        for query in hashes[:60]:
+            expected = sorted(
+                ((hid, halohash.hamming_distance(query, bits))
+                 for hid, bits in enumerate(hashes)
+                 if halohash.hamming_distance(query, bits) <= 7),
+                key=lambda m: (m[1], m[0]))
+            assert expected == idx.query(query, max_distance=7)
+
+    def test_query_with_non_byte_aligned_bands_and_digests(self):
+        hashes = random_hashes(100, 60)
+        idx = index.HaloIndex(size_in_bits=60, bands=6)
+        for hid, bits in enumerate(hashes):
+            idx.add(hid, bits)
+        assert [(3, 0)] == idx.query(hashes[3], max_distance=0)
+        assert (3, 2) in idx.query(flip(hashes[3], [0, 59]), max_distance=2)
+
+        digests = index.HaloIndex(size_in_bits=64, bands=4)
+        halo = halohash.BitAverageHaloHash(['a', 'b', 'c'], size_in_bits=64)
+        digests.add('abc', halo.digest())
+        assert [('abc', 0)] == digests.query(halo, max_distance=3)
+
+    def test_remove(self):
+        hashes = random_hashes(10, 32)
+        idx = index.HaloIndex(size_in_bits=32, bands=4)
+        for hid, bits in enumerate(hashes):
+            idx.add(hid, bits)
+        idx.remove(5)
+        assert 5 not in idx
+        assert [] == idx.query(hashes[5], max_distance=0)
+        assert all(5 not in hids for table in idx.tables for hids in table.values())
+
+        # re-adding an id replaces it
+        idx.add(1, hashes[2])
+        assert [1, 2] == sorted(hid for hid, _ in idx.query(hashes[2], 0))
+        assert [] == idx.query(hashes[1], max_distance=0)
+
+    def test_invalid_layout_and_hash_length(self):
+        self.assertRaises(ValueError, index.HaloIndex, 64, 7)
+        idx = index.HaloIndex(size_in_bits=64, bands=8)
+        self.assertRaises(ValueError, idx.add, 1, bitarray('0101'))
+
+    def test_band_recall_decreases_with_distance(self):
+        recalls = [index.band_recall(128, 16, d) for d in range(10, 60, 5)]
+        assert recalls == sorted(recalls, reverse=True)
+        assert all(0 <= r <= 1 for r in recalls)
+
+
+class TestMultiIndexHash(TestCase):
+
+    def brute_force(self, hashes, query, max_distance):
+        matches = []
+        for hid, bits in hashes.items():
+            distance = halohash.hamming_distance(query, bits)
+            if distance <= max_distance:
+                matches.append((hid, distance))
+        return sorted(matches, key=lambda m: (m[1], m[0]))
+
+    def test_query_is_same_as_brute_force(self):
+        rnd = random.Random(3)
+        hashes = dict(enumerate(random_hashes(300, 128, seed=11)))
+        for i in range(60):
+            flips = rnd.sample(range(128), rnd.randint(0, 30))
+            hashes[300 + i] = flip(hashes[i], flips)
+
+        mih = index.MultiIndexHash(size_in_bits=128, substrings=8)
+        for hid, bits in hashes.items():
+            mih.add(hid, bits)
+
+        for hid in range(0, 360, 7):
+            for max_distance in (0, 7, 16, 25, 40):
+                expected = self.brute_force(hashes, hashes[hid], max_distance)
+                assert expected == mih.query(hashes[hid], max_distance)
+
+    def test_incremental_inserts_and_deletes(self):
+        hashes = dict(enumerate(random_hashes(100, 64, seed=12)))
+        mih = index.MultiIndexHash(size_in_bits=64, substrings=4)
+        for hid, bits in hashes.items():
+            mih.add(hid, bits)
+
+        for hid in range(0, 100, 3):
+            mih.remove(hid)
+            del hashes[hid]
+        assert len(hashes) == len(mih)
+        assert all(hid in hids for table in mih.tables
+                   for hids in table.values() for hid in hids)
+
+        query = flip(hashes[1], [0, 10, 20, 30, 40])
+        mih.add('new', query)
+        hashes['new'] = query
+        for max_distance in (0, 5, 12, 20):
+            expected = self.brute_force(hashes, query, max_distance)
+            assert expected == mih.query(query, max_distance)
+
+    def test_neighbor_keys(self):
+        mih = index.MultiIndexHash(size_in_bits=32, substrings=4)
+        keys = list(mih.neighbor_keys(0, 2))
+        # 1 + 8 + 28 keys within distance 2 of a 8 bits key
+        assert 37 == len(keys) == len(set(keys))
+        assert all(bin(k).count('1') <= 2 for k in keys)
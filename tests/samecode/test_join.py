@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+import random
+from unittest import TestCase
+
+from samecode import join
+from samecode.halohash import bytes_to_num
+
+
+def get_items(count, size_in_bits=64, seed=7):
+    """
+    Return a list of (id, digest) with random digests and near-duplicates of
+    some of these digests.
+    """
+    rand = random.Random(seed)
+    nums = []
+    for i in range(count):
+        if nums and rand.random() < 0.5:
+            num = rand.choice(nums)
+            for _ in range(rand.randint(0, 8)):
+                num ^= 1 << rand.randrange(size_in_bits)
+        else:
+            num = rand.getrandbits(size_in_bits)
+        nums.append(num)
+    hex_size = size_in_bits // 4
+    return [('h%d' % i, ('%x' % n).zfill(hex_size).decode('hex'))
+            for i, n in enumerate(nums)]
+
+
+def brute_force(items, max_distance):
+    pairs = []
+    for i, (id1, d1) in enumerate(items):
+        for id2, d2 in items[i + 1:]:
+            distance = bin(bytes_to_num(d1) ^ bytes_to_num(d2)).count('1')
+            if distance <= max_distance:
+                pairs.append((id1, id2, distance))
+    return sorted(pairs)
+
+
+class TestSelfJoin(TestCase):
+
+    def test_segments_cover_all_bits(self):
+        for size, distance in [(64, 0), (64, 5), (128, 15), (32, 31)]:
+            layout = join.segments(size, distance)
+            assert distance + 1 == len(layout)
+            covered = 0
+            for shift, mask in layout:
+                assert not covered & (mask << shift)
+                covered |= mask << shift
+            assert (1 << size) - 1 == covered
+        self.assertRaises(ValueError, join.segments, 32, 32)
+
+    def test_self_join_is_the_same_as_brute_force(self):
+        items = get_items(400)
+        for max_distance in (0, 3, 6, 12):
+            expected = brute_force(items, max_distance)
+            result = list(join.self_join(items, max_distance, partitions=7))
+            assert expected == sorted(result)
+            assert len(set(result)) == len(result)
+
+    def test_self_join_with_processes_and_spilling(self):
+        items = get_items(300, size_in_bits=128)
+        expected = list(join.self_join(items, 10))
+        assert expected
+        result = list(join.self_join(items, 10, processes=2, memory_budget=100))
+        assert sorted(expected) == sorted(result)
+
+    def test_self_join_splits_partitions_larger_than_the_memory_budget(self):
+        items = get_items(1000)
+        expected = brute_force(items, 3)
+        memory_budget = 1000 * join.JOIN_MEMORY_RATIO
+        sizes = []
+        original = join._join_partition
+
+        def join_partition(args):
+            data, location = args[:2]
+            sizes.append(location and os.path.getsize(location) or len(data))
+            return original(args)
+
+        try:
+            join._join_partition = join_partition
+            result = list(join.self_join(items, 3, partitions=2,
+                                         memory_budget=memory_budget))
+        finally:
+            join._join_partition = original
+        assert expected == sorted(result)
+        assert len(sizes) > 2
+        assert max(sizes) <= 1000
+
+    def test_self_join_deletes_spilled_partitions(self):
+        items = get_items(50)
+        parts = []
+        original = join._Partitions
+
+        class Partitions(original):
+            def __init__(self, *args, **kwargs):
+                original.__init__(self, *args, **kwargs)
+                parts.append(self)
+
+        try:
+            join._Partitions = Partitions
+            list(join.self_join(items, 4, memory_budget=10))
+        finally:
+            join._Partitions = original
+        assert parts[0].temp_dir
+        assert not os.path.exists(parts[0].temp_dir)
+
+    def test_self_join_with_different_sizes_fails(self):
+        items = [('a', '\x00\x00'), ('b', '\x00')]
+        self.assertRaises(ValueError, list, join.self_join(items, 2))
@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+import random
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import halohash
+from samecode import store
+
+
+class TestFingerprintStore(FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def get_hashes(self, count=300):
+        rnd = random.Random(42)
+        words = [str(x) for x in range(2000)]
+        hashes = []
+        for i in range(count):
+            tokens = rnd.sample(words, 40)
+            hashes.append(('file-%d' % i, halohash.BitAverageHaloHash(tokens, size_in_bits=128)))
+        return hashes
+
+    def test_write_and_read_store(self):
+        location = os.path.join(self.get_temp_dir(), 'fingerprints')
+        hashes = self.get_hashes()
+        assert 300 == store.write_store(location, hashes, digest_size=16)
+        assert os.path.exists(store.ids_location(location))
+        # header + digests only
+        assert store.HEADER.size + 300 * 16 == os.path.getsize(location)
+        # one offset per id and the size of the ids file
+        assert 301 * store.OFFSET.size == os.path.getsize(store.offsets_location(location))
+
+        with store.FingerprintStore(location) as fps:
+            assert 300 == len(fps)
+            assert 16 == fps.digest_size
+            expected = [(fid, h.digest()) for fid, h in hashes]
+            assert expected == list(fps)
+            assert 'file-0' == fps.fid(0)
+            assert 'file-299' == fps.fid(299)
+            self.assertRaises(IndexError, fps.fid, 300)
+
+    def check_query(self, use_numpy):
+        location = os.path.join(self.get_temp_dir(), 'fingerprints')
+        hashes = self.get_hashes()
+        store.write_store(location, hashes, digest_size=16)
+
+        numpy = store.numpy
+        if not use_numpy:
+            store.numpy = None
+        try:
+            with store.FingerprintStore(location) as fps:
+                fps.chunk_rows = 64
+                for _, query in hashes[:10]:
+                    expected = sorted(
+                        ((fid, query.distance(h)) for fid, h in hashes
+                         if query.distance(h) <= 50),
+                        key=lambda m: m[1])
+                    result = fps.query(query, max_distance=50)
+                    assert expected == result
+                    assert 0 == result[0][1]
+        finally:
+            store.numpy = numpy
+
+    def test_query_with_numpy(self):
+        if not store.numpy:
+            return
+        self.check_query(use_numpy=True)
+
+    def test_query_without_numpy(self):
+        self.check_query(use_numpy=False)
+
+    def test_empty_store(self):
+        location = os.path.join(self.get_temp_dir(), 'fingerprints')
+        assert 0 == store.write_store(location, [], digest_size=32)
+        with store.FingerprintStore(location) as fps:
+            assert 0 == len(fps)
+            assert [] == fps.query('\0' * 32, max_distance=256)
+
+    def test_invalid_digests_and_stores(self):
+        location = os.path.join(self.get_temp_dir(), 'fingerprints')
+        with store.FingerprintStoreWriter(location, digest_size=16) as writer:
+            self.assertRaises(ValueError, writer.add, 'a', '\0' * 8)
+            self.assertRaises(ValueError, writer.add, 'a\nb', '\0' * 16)
+
+        not_a_store = os.path.join(self.get_temp_dir(), 'not_a_store')
+        with open(not_a_store, 'wb') as f:
+            f.write('some random content that is not a store')
+        self.assertRaises(ValueError, store.FingerprintStore, not_a_store)
+
+        store.write_store(location, self.get_hashes(3), digest_size=16)
+        with open(store.offsets_location(location), 'ab') as f:
+            f.write(store.OFFSET.pack(0))
+        self.assertRaises(ValueError, store.FingerprintStore, location)
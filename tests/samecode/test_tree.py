@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2017 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import os
+
+from commoncode.testcase import FileBasedTesting
+
+from samecode import hash as commoncode_hash
+from samecode import tree
+
+
+class TestFingerprintTree(FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_batches_are_balanced_by_size_and_count(self):
+        files = [('a', 10), ('b', 10), ('c', 30), ('d', 1), ('e', 1), ('f', 1)]
+        result = list(tree.batches(files, batch_bytes=20, batch_files=2))
+        assert [['a', 'b'], ['c'], ['d', 'e'], ['f']] == result
+
+    def test_walk_files_is_sorted(self):
+        test_dir = self.get_test_loc('halohash')
+        result = [path for path, _size in tree.walk_files(test_dir)]
+        assert result
+        expected = []
+        for top, dirs, files in os.walk(test_dir):
+            dirs.sort()
+            expected.extend(os.path.join(top, f) for f in sorted(files))
+        assert expected == result
+
+    def test_walk_files_order(self):
+        test_dir = self.get_temp_dir()
+        # created out of order so that the order on disk is not sorted
+        for path in ['z/b', 'z/a', 'b/z/a', 'b/a', 'a/b', 'a/a', 'y', 'c']:
+            location = os.path.join(test_dir, path)
+            if not os.path.exists(os.path.dirname(location)):
+                os.makedirs(os.path.dirname(location))
+            with open(location, 'wb') as f:
+                f.write(path)
+        result = [os.path.relpath(path, test_dir)
+                  for path, _size in tree.walk_files(test_dir)]
+        # files of a directory come before the files of its sub-directories
+        expected = ['c', 'y', 'a/a', 'a/b', 'b/a', 'b/z/a', 'z/a', 'z/b']
+        assert expected == result
+
+    def test_fingerprint_tree(self):
+        test_dir = self.get_test_loc('halohash')
+        records = list(tree.fingerprint_tree(test_dir, batch_files=3))
+        paths = [path for path, _size in tree.walk_files(test_dir)]
+        assert paths == [r.path for r in records]
+
+        record = records[0]
+        assert commoncode_hash.sha1(record.path) == record.checksums['sha1']
+        assert commoncode_hash.md5(record.path) == record.checksums['md5']
+        assert 16 == len(record.halohash)
+
+    def test_fingerprint_tree_with_workers_has_same_results(self):
+        test_dir = self.get_test_loc('halohash')
+        expected = list(tree.fingerprint_tree(test_dir))
+        result = list(tree.fingerprint_tree(
+            test_dir, workers=2, batch_files=2, max_pending=2))
+        assert expected == result
+
+    def test_fingerprint_tree_on_empty_file(self):
+        test_file = os.path.join(self.get_temp_dir(), 'empty')
+        open(test_file, 'wb').close()
+        result = list(tree.fingerprint_tree(test_file))
+        expected = [tree.Record(test_file, {'md5': None, 'sha1': None}, None, None)]
+        assert expected == result
+
+    def test_fingerprint_tree_with_vanished_files(self):
+        test_dir = self.get_temp_dir()
+        existing = os.path.join(test_dir, 'existing')
+        with open(existing, 'wb') as f:
+            f.write('some content')
+        vanished = os.path.join(test_dir, 'vanished')
+        assert 0 == tree.file_size(vanished)
+
+        def walk_files(root):
+            for path in (vanished, existing):
+                yield path, tree.file_size(path)
+
+        original = tree.walk_files
+        try:
+            tree.walk_files = walk_files
+            for workers in (None, 2):
+                records = list(tree.fingerprint_tree(test_dir, workers=workers))
+                assert [vanished, existing] == [r.path for r in records]
+                failed, record = records
+                assert None == failed.checksums
+                assert None == failed.halohash
+                assert 'No such file' in failed.error
+                assert commoncode_hash.md5(existing) == record.checksums['md5']
+                assert None == record.error
+        finally:
+            tree.walk_files = original
@@ -25,10 +25,32 @@
 from __future__ import absolute_import, print_function
 
 import os
+from StringIO import StringIO
 
+from commoncode import filetype
 from commoncode.testcase import FileBasedTesting
 from sourcecode import metrics
 
+# un-comment to run perf tests
+PERF_TEST_ENABLED = False
+
+
+def lines_count_by_line(lines):
+    """
+    Return a tuple of (code, comment) counts for an iterable of lines using
+    the previous line by line implementation.
+    """
+    code = 0
+    comment = 0
+    for line in lines:
+        ls = line.strip()
+        if ls:
+            if ls.startswith(('/', '#', '@rem', ';', '*',)):
+                comment += 1
+            else:
+                code += 1
+    return code, comment
+
 
 class TestLineCount(FileBasedTesting):
     test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
@@ -71,3 +93,150 @@ class TestLineCount(FileBasedTesting):
         comments = metrics.get_comment_lines_count(test_dir)
         assert code == 7398
         assert comments == 2884
+
+    def test_get_lines_count_walks_a_tree_once(self):
+        test_dir = self.get_test_loc('metrics/lines')
+        calls = []
+        tree_lines_count = metrics.tree_lines_count
+
+        def counting_tree_lines_count(location):
+            calls.append(location)
+            return tree_lines_count(location)
+
+        metrics.directories_lines_count_cache.clear()
+        try:
+            metrics.tree_lines_count = counting_tree_lines_count
+            assert (7398, 2884) == metrics.get_lines_count(test_dir)
+            assert 7398 == metrics.get_code_lines_count(test_dir)
+            assert 2884 == metrics.get_comment_lines_count(test_dir)
+            for sub_dir in ('sub1', 'sub1/subsub', 'sub2'):
+                path = os.path.join(test_dir, sub_dir)
+                expected = (filetype.counter(path, 'code_lines'),
+                            filetype.counter(path, 'comment_lines'))
+                assert expected == metrics.get_lines_count(path)
+        finally:
+            metrics.tree_lines_count = tree_lines_count
+            metrics.directories_lines_count_cache.clear()
+        assert [test_dir] == calls
+
+    def test_tree_lines_count(self):
+        test_dir = self.get_test_loc('metrics/lines')
+        result = metrics.tree_lines_count(test_dir)
+        assert 7398 == result.code
+        assert 2884 == result.comment
+        assert (7398, 2884) == result.directories[os.path.normpath(test_dir)]
+        for path, (code, comment) in result.directories.items():
+            assert filetype.counter(path, 'code_lines') == code
+            assert filetype.counter(path, 'comment_lines') == comment
+
+    def test_tree_lines_count_with_processes(self):
+        test_dir = self.get_test_loc('metrics/lines')
+        expected = metrics.tree_lines_count(test_dir)
+        result = metrics.tree_lines_count(test_dir, processes=2, batch_size=3)
+        assert expected == result
+
+    def test_tree_lines_count_file(self):
+        test_file = self.get_test_loc('metrics/lines/amrr.c')
+        assert (390, 151, {}) == metrics.tree_lines_count(test_file)
+
+    def test_lines_count_is_the_same_as_counting_by_line(self):
+        import random
+        rand = random.Random(5)
+        parts = ['\n', '\r\n', ' ', '\t', '\x0b', '\x0c', '\r', '/', '#', ';',
+                 '*', '@rem', '@re', '@', 'r', 'int', 'a', '\x00', '\xff', '\x1c',
+                 '\x85', '\xa0']
+        for _ in range(300):
+            content = ''.join(rand.choice(parts) for _ in range(rand.randint(0, 80)))
+            # lines are split on \n only as when iterating a file
+            expected = lines_count_by_line(StringIO(content))
+            for size in (1, 3, 16, 1000):
+                blocks = [content[i:i + size] for i in range(0, len(content), size)]
+                assert expected == metrics.lines_count(blocks)
+
+    def test_lines_count_of_test_files(self):
+        test_dir = self.get_test_loc('metrics/lines')
+        for top, _dirs, files in os.walk(test_dir):
+            for name in files:
+                with open(os.path.join(top, name), 'rb') as lines:
+                    expected = lines_count_by_line(lines)
+                with open(os.path.join(top, name), 'rb') as f:
+                    assert expected == metrics.lines_count([f.read()])
+
+
+class TestLinesCountCache(FileBasedTesting):
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_file_lines_count_is_cached(self):
+        test_file = self.get_test_loc('metrics/lines/amrr.c')
+        cache = metrics.lines_count_cache
+        cache.clear()
+        assert (390, 151) == metrics.file_lines_count(test_file)
+        assert (390, 151) == metrics.file_lines_count(test_file)
+        stats = cache.stats()
+        assert 1 == stats['hits']
+        assert 1 == stats['misses']
+        assert 1 == stats['entries']
+        cache.clear()
+        assert 0 == cache.stats()['entries']
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        cache = metrics.LRUCache(max_entries=2)
+        test_dir = self.get_temp_dir()
+        locations = []
+        for i in range(3):
+            location = os.path.join(test_dir, str(i))
+            with open(location, 'wb') as f:
+                f.write('x' * i)
+            locations.append(location)
+
+        cache.get(locations[0], len)
+        cache.get(locations[1], len)
+        # refresh 0 then add 2: 1 is evicted
+        cache.get(locations[0], len)
+        cache.get(locations[2], len)
+        assert 1 == cache.stats()['evictions']
+        assert [locations[0], locations[2]] == list(cache.entries)
+
+    def test_lru_cache_is_invalidated_on_file_change(self):
+        cache = metrics.LRUCache()
+        test_file = os.path.join(self.get_temp_dir(), 'a.c')
+        with open(test_file, 'wb') as f:
+            f.write('int a;\n')
+        assert 'int a;\n' == cache.get(test_file, lambda loc: open(loc).read())
+        with open(test_file, 'wb') as f:
+            f.write('int ab;\n')
+        assert 'int ab;\n' == cache.get(test_file, lambda loc: open(loc).read())
+        assert 2 == cache.stats()['misses']
+        assert 1 == cache.stats()['entries']
+
+
+if PERF_TEST_ENABLED:
+
+    class TestLinesCountPerformance(FileBasedTesting):
+        test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+        def test_lines_count_timing(self):
+            import timeit
+            # an amalgamated multi-MB source file
+            with open(self.get_test_loc('metrics/lines/amrr.c'), 'rb') as f:
+                source = f.read()
+            test_file = os.path.join(self.get_temp_dir(), 'amalgamation.c')
+            with open(test_file, 'wb') as f:
+                for _ in range(500):
+                    f.write(source)
+
+            def by_line():
+                with open(test_file, 'rb') as lines:
+                    return lines_count_by_line(lines)
+
+            def by_block():
+                with open(test_file, 'rb') as f:
+                    return metrics.lines_count(
+                        iter(lambda: f.read(metrics.BLOCK_SIZE), b''))
+
+            assert by_line() == by_block()
+            before = timeit.timeit(by_line, number=3) / 3
+            after = timeit.timeit(by_block, number=3) / 3
+            size = os.path.getsize(test_file) / 2 ** 20
+            print('lines count of %.1f MB: by line: %.3fs by block: %.3fs'
+                  % (size, before, after))
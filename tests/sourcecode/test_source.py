@@ -27,6 +27,7 @@ from __future__ import absolute_import, print_function
 import os
 
 from commoncode.testcase import FileBasedTesting
+from sourcecode import source
 from sourcecode.source import Source
 
 class TestSource(FileBasedTesting):
@@ -35,6 +36,32 @@ class TestSource(FileBasedTesting):
     def test_source_tags(self):
         self._do_test_source(TEST_DATA)
 
+    def test_source_from_many(self):
+        locations = sorted(TEST_DATA)
+        test_files = [self.get_test_loc(location) for location in locations]
+        sources = Source.from_many(test_files, batch_size=7)
+        assert test_files == list(sources)
+        for location, test_file in zip(locations, test_files):
+            src = sources[test_file]
+            result = src.files, src.global_functions, src.local_functions
+            assert TEST_DATA[location] == result
+
+    def test_collect_tags_streams_tags_of_each_file(self):
+        test_files = [self.get_test_loc(location) for location in sorted(TEST_DATA)]
+        tags = source.collect_tags(test_files)
+        first = next(tags)
+        assert test_files[0] == first[0]
+        # stop early: the ctags process is killed
+        tags.close()
+
+    def test_collect_tags_with_missing_file(self):
+        assert [] == list(source.collect_tags([self.get_temp_dir() + '/foo.c']))
+
+    def test_collect_tags_timeout(self):
+        test_files = [self.get_test_loc(location) for location in sorted(TEST_DATA)]
+        tags = source.collect_tags(test_files * 50, timeout=0.001)
+        self.assertRaises(Exception, list, tags)
+
     def _do_test_source(self, testdata):
         for location, expected in testdata.items():
             test_file = self.get_test_loc(location)